@@ -0,0 +1,260 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+import numpy as np
+from src.GameBot import GameBot
+from src.HeadlessSim import HeadlessGame, SimGameInfo
+from src.MarineAgent import MarineAgent
+
+# Sizes of the synthetic maps with random obstacles: [map_y_size, map_x_size]
+SYNTHETIC_MAPS = {"medium": [96, 128], "large": [176, 200]}
+# "12square" is the layout of the 12SquareMarinevsBaneling maps (see HeadlessGame.square_layout())
+MAP_PRESETS = ["12square"] + list(SYNTHETIC_MAPS)
+# The bot is given a copy of the template, so a benchmark never reads or changes the learned action matrix
+ACTION_MATRIX_FILE = "action_matrix_template.json"
+
+
+def synthetic_layout(pathing_grid, pairs, seed=0, spacing=16):
+    """
+    Places pairs of marines with a baneling in front of them on a pathing grid. Every pair gets its own cell of
+    spacing x spacing points, so the two marines closest to a baneling are always its own pair.
+    :param pathing_grid: numpy array (indexed as [y][x])
+    :param pairs: int
+    :param seed: int
+    :param spacing: int
+    :return: tuple (marine positions, baneling positions)
+    """
+    rng = np.random.default_rng(seed)
+    cells = [(x, y) for y in range(0, pathing_grid.shape[0] - spacing + 1, spacing)
+             for x in range(0, pathing_grid.shape[1] - spacing + 1, spacing)]
+    rng.shuffle(cells)
+
+    marine_positions, baneling_positions = [], []
+    for x, y in cells:
+        points = [(x + 3.5, y + 7.0), (x + 3.5, y + 9.0), (x + 10.5, y + 8.0)]
+        if all(pathing_grid[int(point[1]), int(point[0])] != 0 for point in points):
+            marine_positions += points[:2]
+            baneling_positions.append(points[2])
+        if len(baneling_positions) == pairs:
+            break
+
+    return marine_positions, baneling_positions
+
+
+def synthetic_grid(map_y_size, map_x_size, seed=0):
+    """
+    Creates a pathing grid with a wall around the map and some random rectangular obstacles.
+    :param map_y_size: int
+    :param map_x_size: int
+    :param seed: int
+    :return: numpy array (uint8)
+    """
+    rng = np.random.default_rng(seed)
+    pathing_grid = np.zeros((map_y_size, map_x_size), dtype="uint8")
+    pathing_grid[1:-1, 1:-1] = 1
+    for _ in range(map_y_size * map_x_size // 512):
+        y, x = rng.integers(0, map_y_size), rng.integers(0, map_x_size)
+        pathing_grid[y:y + rng.integers(1, 4), x:x + rng.integers(1, 4)] = 0
+
+    return pathing_grid
+
+
+def load_pathing_grid(map_name):
+    """
+    Returns the pathing grid of a map preset or of a pathing grid saved as .npy file.
+    :param map_name: string
+    :return: numpy array (uint8)
+    """
+    if map_name == "12square":
+        return HeadlessGame.square_layout()[0]
+    if map_name in SYNTHETIC_MAPS:
+        return synthetic_grid(*SYNTHETIC_MAPS[map_name])
+    return np.load(map_name).astype("uint8")
+
+
+def create_bot(pathing_grid, pairs, seed=0):
+    """
+    Creates a GameBot on a synthetic layout and runs its on_start(), like the first step of a game.
+    :param pathing_grid: numpy array
+    :param pairs: int
+    :param seed: int
+    :return: tuple (bot, HeadlessGame)
+    """
+    marine_positions, baneling_positions = synthetic_layout(pathing_grid, pairs, seed)
+    game = HeadlessGame(pathing_grid, marine_positions, baneling_positions)
+    with open(ACTION_MATRIX_FILE, "r") as f:
+        action_matrix = json.load(f)
+    bot = HeadlessGame.create_bot(GameBot, action_matrix, persist=False)
+    # Every square takes one of the type combinations, so repeat them for layouts with more than 12 squares
+    bot.marine_type_combinations = bot.marine_type_combinations * (pairs // 12 + 1)
+    bot._simulation = game
+    bot._game_info = SimGameInfo(game.pathing_grid, game.map_name)
+    game.prepare_step(bot)
+    bot.on_start()
+    bot.update_unit_index()
+    return bot, game
+
+
+def benchmark_functions(bot):
+    """
+    Returns the functions that are timed, each one runs the code of one step for all marines.
+    :param bot: GameBot
+    :return: dict (name: function)
+    """
+    marines = list(bot.units)
+    banelings = list(bot.known_enemy_units)
+    agents = [bot.agent_dict[str(marine.tag)] for marine in marines]
+    masks = [bot.disc_masks.get(marine.position, marine.sight_range) for marine in marines]
+    bot.update_danger_field(banelings)
+
+    def percept_environment():
+        for agent, mask in zip(agents, masks):
+            agent.percept_environment(mask)
+
+    incremental_agents = [MarineAgent(bot.pathing_map, bot.map_y_size, bot.map_x_size, agent.tag, incremental=True)
+                          for agent in agents]
+
+    def percept_environment_incremental():
+        # The marines stand still between calls, so this measures the best case of the incremental mode
+        for agent, mask in zip(incremental_agents, masks):
+            agent.percept_environment(mask)
+
+    # Masks of marines that walk 0.3 points to the right every step (and jump back after 10 steps)
+    walking_masks = [[bot.disc_masks.get((marine.position[0] + 0.3 * step, marine.position[1]), marine.sight_range)
+                      for marine in marines] for step in range(10)]
+    walking_agents = [MarineAgent(bot.pathing_map, bot.map_y_size, bot.map_x_size, agent.tag, incremental=True)
+                      for agent in agents]
+    walking_step = [0]
+
+    def percept_environment_walking():
+        for agent, mask in zip(agents, walking_masks[walking_step[0] % 10]):
+            agent.percept_environment(mask)
+        walking_step[0] += 1
+
+    def percept_environment_incremental_walking():
+        # Every step changes the vision of every marine, so the incremental mode falls back to a full recount
+        for agent, mask in zip(walking_agents, walking_masks[walking_step[0] % 10]):
+            agent.percept_environment(mask)
+        walking_step[0] += 1
+
+    def percept_environment_batch():
+        MarineAgent.percept_environment_batch(agents, masks)
+
+    def get_best_point():
+        for agent, mask in zip(agents, masks):
+            agent.get_best_point(mask, banelings)
+
+    def get_best_point_batch():
+        MarineAgent.get_best_point_batch(agents, masks)
+
+    def create_circular_mask():
+        for marine in marines:
+            bot.create_circular_mask(marine.position, marine.sight_range)
+
+    def disc_masks():
+        for marine in marines:
+            bot.disc_masks.get(marine.position, marine.sight_range)
+
+    def create_baneling_masks():
+        bot.create_baneling_masks(banelings)
+
+    def apply_baneling_sof():
+        bot.update_danger_field(banelings)
+        for agent, mask in zip(agents, masks):
+            agent.apply_baneling_sof(bot.danger_field, mask)
+
+    def give_scores():
+        bot.update_unit_index()
+        bot.give_scores()
+
+    return {"percept_environment": percept_environment,
+            "percept_environment_incremental": percept_environment_incremental,
+            "percept_environment_walking": percept_environment_walking,
+            "percept_environment_incremental_walking": percept_environment_incremental_walking,
+            "percept_environment_batch": percept_environment_batch,
+            "get_best_point": get_best_point, "get_best_point_batch": get_best_point_batch,
+            "create_circular_mask": create_circular_mask, "disc_masks": disc_masks,
+            "create_baneling_masks": create_baneling_masks, "apply_baneling_sof": apply_baneling_sof,
+            "give_scores": give_scores}
+
+
+def measure(function, repeat):
+    """
+    Times a function and measures the peak memory it allocates.
+    :param function: function
+    :param repeat: int
+    :return: dict (median and minimum time in ms, peak memory in KiB)
+    """
+    function()  # Warm up caches (disc stencils, stored scores)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"median_ms": float(np.median(timings)), "min_ms": float(np.min(timings)), "peak_kib": peak / 1024}
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares results with a baseline and returns the benchmarks whose median time grew by more than the
+    threshold (0.2 = 20% slower).
+    :param results: dict
+    :param baseline: dict
+    :param threshold: float
+    :return: list of strings
+    """
+    regressions = []
+    for key, result in results.items():
+        if key in baseline and result["median_ms"] > baseline[key]["median_ms"] * (1 + threshold):
+            regressions.append(f"{key}: {baseline[key]['median_ms']:.3f} ms -> {result['median_ms']:.3f} ms")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the perception and decision code without SC2.")
+    parser.add_argument("--maps", nargs="+", default=MAP_PRESETS,
+                        help=f"map presets ({', '.join(MAP_PRESETS)}) or saved pathing grids (.npy)")
+    parser.add_argument("--pairs", nargs="+", type=int, default=[4, 12], help="number of marine pairs per map")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", nargs="+", help="only run these benchmarks")
+    parser.add_argument("--baseline", help="JSON file to compare against")
+    parser.add_argument("--save-baseline", help="JSON file to save the results to")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before a regression")
+    args = parser.parse_args()
+
+    results = {}
+    for map_name in args.maps:
+        pathing_grid = load_pathing_grid(map_name)
+        for pairs in args.pairs:
+            bot, _ = create_bot(pathing_grid, pairs)
+            marines = len(bot.units)
+            for name, function in benchmark_functions(bot).items():
+                if args.only and name not in args.only:
+                    continue
+                key = f"{map_name}/{marines}/{name}"
+                results[key] = measure(function, args.repeat)
+                print(f"{key:<55} {results[key]['median_ms']:>9.3f} ms {results[key]['peak_kib']:>9.1f} KiB")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,20 @@
-import json
 from sc2 import run_game, maps, Race, Difficulty
 from sc2.player import Bot, Computer
 from src.GameBot import GameBot
+from src.ActionMatrixStore import ActionMatrixStore
 
+store = ActionMatrixStore()
+action_matrix = store.load()
 for i in range(10):
-    try:
-        with open("action_matrix.json", "r") as f:
-            action_matrix = json.load(f)
-    except:
-        with open("action_matrix_template.json", "r") as f:
-            action_matrix = json.load(f)
-
     try:
         run_game(maps.get("12SquareMarinevsBanelingslow2"),
                     [
-                        Bot(Race.Terran, GameBot(action_matrix)),
+                        Bot(Race.Terran, GameBot(action_matrix, batched=True, store=store)),
                         Computer(Race.Zerg, Difficulty.Hard)
                     ], realtime=True)
     except Exception as err:
         print(f"Error while running game loop: {err}")
+store.compact()
 
 
 
@@ -0,0 +1,5 @@
+from src.ActionMatrixStore import ActionMatrixStore
+from src.EpisodeRunner import EpisodeRunner
+
+if __name__ == "__main__":
+    EpisodeRunner(ActionMatrixStore()).run(40)
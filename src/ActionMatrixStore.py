@@ -0,0 +1,140 @@
+import json
+import os
+
+
+class ActionMatrixStore:
+    def __init__(self, snapshot_file="action_matrix.json", journal_file="action_matrix.journal",
+                 template_file="action_matrix_template.json", compact_every=20):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file
+        self.template_file = template_file
+        self.compact_every = compact_every
+        self.action_matrix = None
+        self.sequence = 0
+        self.journal_entries = 0
+
+    @staticmethod
+    def merge_deltas(action_matrix, deltas):
+        """
+        Merges the deltas of an iteration (see GameBot.collect_action_matrix_deltas()) into the running averages
+        of an action_matrix.
+        :param action_matrix: nested dict
+        :param deltas: nested dict
+        :return: void
+        """
+        for m1_action in deltas["Counts"]:
+            for m2_action in deltas["Counts"][m1_action]:
+                k0, k1 = deltas["Counts"][m1_action][m2_action]
+                s0, s1 = deltas["Sums"][m1_action][m2_action]
+                old_payoffs = action_matrix["Scores"][m1_action][m2_action]
+                n0, n1 = action_matrix["Counts"][m1_action][m2_action]
+
+                # Calculate running average
+                new_payoffs = (
+                    (old_payoffs[0] * n0 + s0) / (n0 + k0),
+                    (old_payoffs[1] * n1 + s1) / (n1 + k1)
+                )
+
+                # Replace the old values
+                action_matrix["Scores"][m1_action][m2_action] = new_payoffs
+                action_matrix["Counts"][m1_action][m2_action] = (n0 + k0, n1 + k1)
+
+    @staticmethod
+    def write_atomic(file, text):
+        """
+        Writes a file in a way that survives a crash: the text is written and flushed to disk in a temporary
+        file, which then replaces the old file in one step. Readers see either the old or the new file.
+        :param file: string
+        :param text: string
+        :return: void
+        """
+        temp_file = f"{file}.tmp"
+        with open(temp_file, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, file)
+
+    def load(self):
+        """
+        Loads the last snapshot (or the template when there is none yet) and replays the journal entries that
+        came after it. A last journal line that was cut off by a crash is removed, and a complete last line that
+        lost its newline gets it back, so the next entry is never written onto the same line. Every other broken
+        line or snapshot raises an error instead of resetting the learned payoffs.
+        :return: nested dict (the action_matrix)
+        """
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, "r") as f:
+                action_matrix = json.load(f)
+        else:
+            with open(self.template_file, "r") as f:
+                action_matrix = json.load(f)
+        self.sequence = action_matrix.pop("Sequence", 0)
+        self.journal_entries = 0
+
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, "rb") as f:
+                lines = f.readlines()
+
+            valid_bytes = 0
+            for number, line in enumerate(lines):
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    if number == len(lines) - 1:
+                        print(f"Removing incomplete last entry of {self.journal_file}")
+                        with open(self.journal_file, "r+b") as f:
+                            f.truncate(valid_bytes)
+                        break
+                    raise
+
+                valid_bytes += len(line)
+                if not line.endswith(b"\n"):
+                    # The crash happened just before the newline was written, the entry itself is complete
+                    with open(self.journal_file, "ab") as f:
+                        f.write(b"\n")
+                        f.flush()
+                        os.fsync(f.fileno())
+                if entry["Sequence"] > self.sequence:
+                    self.merge_deltas(action_matrix, entry)
+                    self.sequence = entry["Sequence"]
+                    self.journal_entries += 1
+
+        self.action_matrix = action_matrix
+        return self.action_matrix
+
+    def append(self, deltas):
+        """
+        Adds the deltas of one iteration to the action_matrix and appends them to the journal, so the cost per
+        iteration does not depend on how much was learned before. Every self.compact_every entries the journal
+        is compacted into a new snapshot.
+        :param deltas: nested dict (see GameBot.collect_action_matrix_deltas())
+        :return: void
+        """
+        if self.action_matrix is None:
+            self.load()
+
+        self.sequence += 1
+        entry = {"Sequence": self.sequence, "Counts": deltas["Counts"], "Sums": deltas["Sums"]}
+        with open(self.journal_file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.merge_deltas(self.action_matrix, deltas)
+        self.journal_entries += 1
+        if self.journal_entries >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """
+        Writes the action_matrix with its sequence number as a new snapshot and empties the journal. When a
+        crash happens in between, load() skips the journal entries that are already in the snapshot.
+        :return: void
+        """
+        if self.action_matrix is None:
+            return
+
+        self.write_atomic(self.snapshot_file, json.dumps(dict(self.action_matrix, Sequence=self.sequence)))
+        self.write_atomic(self.journal_file, "")
+        self.journal_entries = 0
@@ -0,0 +1,110 @@
+import math
+import numpy as np
+
+
+class DiscMask:
+    def __init__(self, row_start, col_start, mask):
+        self.row_start = row_start
+        self.col_start = col_start
+        self.mask = mask
+
+    @property
+    def rows(self):
+        """
+        Returns the rows of the map that are covered by this mask.
+        :return: slice
+        """
+        return slice(self.row_start, self.row_start + self.mask.shape[0])
+
+    @property
+    def cols(self):
+        """
+        Returns the columns of the map that are covered by this mask.
+        :return: slice
+        """
+        return slice(self.col_start, self.col_start + self.mask.shape[1])
+
+    def contains(self, row, col):
+        """
+        Checks if a given index of the (flipped) map lies inside the disc.
+        :param row: int
+        :param col: int
+        :return: boolean
+        """
+        row -= self.row_start
+        col -= self.col_start
+        return 0 <= row < self.mask.shape[0] and 0 <= col < self.mask.shape[1] and bool(self.mask[row, col])
+
+    def to_full(self, map_y_size, map_x_size):
+        """
+        Places the window in a full map sized boolean array, like the ones GameBot.create_circular_mask()
+        returns after they are flipped. Only used by code that still needs a whole map mask.
+        :param map_y_size: int
+        :param map_x_size: int
+        :return: numpy array (booleans)
+        """
+        full_mask = np.zeros((map_y_size, map_x_size), dtype=bool)
+        full_mask[self.rows, self.cols] = self.mask
+        return full_mask
+
+
+class DiscMaskCache:
+    def __init__(self, map_y_size, map_x_size):
+        self.map_y_size = map_y_size
+        self.map_x_size = map_x_size
+        self.stencils = {}
+
+    def stencil(self, radius):
+        """
+        Returns the disc of the given radius around an integer center as a square boolean array. Stencils are
+        computed once and stored by radius, so every mask around an integer center (like the rounded baneling
+        positions) reuses them.
+        :param radius: int/float
+        :return: numpy array (booleans)
+        """
+        if radius not in self.stencils:
+            reach = max(math.floor(radius), 0)
+            offsets = np.arange(-reach, reach + 1)
+            self.stencils[radius] = np.sqrt(offsets[np.newaxis, :] ** 2 + offsets[:, np.newaxis] ** 2) <= radius
+
+        return self.stencils[radius]
+
+    def clip(self, start, end, size):
+        """
+        Clips a range of indices to the map so that it can be used as a (possibly empty) slice.
+        :param start: int
+        :param end: int
+        :param size: int
+        :return: tuple
+        """
+        start = min(max(start, 0), size)
+        return start, min(max(end, start), size)
+
+    def get(self, center, radius):
+        """
+        Returns the same circle as np.flip(GameBot.create_circular_mask(center, radius), 0), but only the window
+        around the disc's bounding box instead of a new full map array. Integer centers use a cached stencil,
+        other centers only compute the distances inside the bounding box.
+        :param center: tuple / sc2 Point2
+        :param radius: int/float
+        :return: DiscMask
+        """
+        center_x, center_y = center[0], center[1]
+        if center_x == int(center_x) and center_y == int(center_y):
+            reach = max(math.floor(radius), 0)
+            x_start, x_end = int(center_x) - reach, int(center_x) + reach + 1
+            y_start, y_end = int(center_y) - reach, int(center_y) + reach + 1
+            x_clipped = self.clip(x_start, x_end, self.map_x_size)
+            y_clipped = self.clip(y_start, y_end, self.map_y_size)
+            window = self.stencil(radius)[y_clipped[0] - y_start:y_clipped[1] - y_start,
+                                          x_clipped[0] - x_start:x_clipped[1] - x_start]
+        else:
+            x_clipped = self.clip(math.floor(center_x - radius), math.ceil(center_x + radius) + 1, self.map_x_size)
+            y_clipped = self.clip(math.floor(center_y - radius), math.ceil(center_y + radius) + 1, self.map_y_size)
+            Y, X = np.ogrid[y_clipped[0]:y_clipped[1], x_clipped[0]:x_clipped[1]]
+            window = np.sqrt((X - center_x) ** 2 + (Y - center_y) ** 2) <= radius
+
+        # Flip the window upside down, the same way the full map masks are flipped
+        window = window[::-1]
+        row_start = self.map_y_size - y_clipped[1]
+        return DiscMask(row_start, x_clipped[0], window)
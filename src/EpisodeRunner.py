@@ -0,0 +1,78 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from src.GameBot import GameBot
+from src.HeadlessSim import HeadlessGame
+
+
+class EpisodeRunner:
+    def __init__(self, store, workers=None, batch_size=None, bot_kwargs=None, layout_kwargs=None, seed=0,
+                 telemetry=None):
+        self.store = store
+        self.action_matrix = store.load()
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size or self.workers
+        self.bot_kwargs = bot_kwargs or {"batched": True}
+        self.layout_kwargs = layout_kwargs or {}
+        self.seed = seed
+        self.telemetry = telemetry
+
+    @staticmethod
+    def play_episode(episode, action_matrix, layout_kwargs, bot_kwargs, seed):
+        """
+        Plays one episode in the headless simulation and returns what it would have added to the
+        action_matrix and agent_data.csv, without writing any files. Runs inside a worker process.
+        :param episode: int
+        :param action_matrix: nested dict
+        :param layout_kwargs: dict (see HeadlessGame.square_layout())
+        :param bot_kwargs: dict (see GameBot)
+        :param seed: int
+        :return: tuple (episode, deltas, agent records)
+        """
+        random.seed(seed + episode)
+        game = HeadlessGame(*HeadlessGame.square_layout(**layout_kwargs))
+        bot = HeadlessGame.create_bot(GameBot, action_matrix, persist=False, **bot_kwargs)
+        game.run(bot)
+        return episode, bot.collect_action_matrix_deltas(), bot.agent_records()
+
+    def save_agent_data(self, records):
+        """
+        Saves the agent records of one episode to the telemetry, or appends them to agent_data.csv when no
+        telemetry is used.
+        :param records: list of tuples (see GameBot.agent_records())
+        :return: void
+        """
+        if self.telemetry is not None:
+            self.telemetry.record_agents(records)
+            return
+
+        with open("agent_data.csv", "a") as data_file:
+            for record in records:
+                data_file.write(";".join(str(value) for value in record) + "\n")
+
+    def run(self, episodes):
+        """
+        Plays a number of episodes in a process pool. Every batch of episodes starts from the same
+        action_matrix; the deltas are merged in episode order once the whole batch is done, so the result does
+        not depend on which worker finishes first and no update is lost. Every episode is appended to the
+        journal of the store and its agent data is saved with save_agent_data().
+        :param episodes: int
+        :return: nested dict (the updated action_matrix)
+        """
+        with ProcessPoolExecutor(self.workers) as executor:
+            for batch_start in range(0, episodes, self.batch_size):
+                batch = range(batch_start, min(batch_start + self.batch_size, episodes))
+                futures = [executor.submit(self.play_episode, episode, self.action_matrix, self.layout_kwargs,
+                                           self.bot_kwargs, self.seed) for episode in batch]
+                results = sorted((future.result() for future in futures), key=lambda result: result[0])
+
+                for episode, deltas, records in results:
+                    self.store.append(deltas)
+                    self.save_agent_data(records)
+
+                print(f"Finished episodes {batch.start}-{batch.stop - 1}")
+
+        self.store.compact()
+        if self.telemetry is not None:
+            self.telemetry.flush()
+        return self.action_matrix
@@ -0,0 +1,98 @@
+import numpy as np
+from sc2.position import Point2
+
+
+class FlowField:
+    def __init__(self, pathing_map, max_distance=32):
+        self.passable = pathing_map != 0.0
+        self.map_y_size, self.map_x_size = self.passable.shape
+        self.max_distance = max_distance
+        self.directions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+        self.distance_field = np.full(self.passable.shape, max_distance + 1, dtype="int32")
+        self.distance_field[~self.passable] = -1
+        self.escape_direction = np.full(self.passable.shape, -1, dtype="int8")
+
+    def update(self, danger_positions):
+        """
+        Computes how many steps every point of the map is away from the nearest danger (the banelings) with
+        one multi-source breadth-first search over the pathing grid, walls block the search. The search stops
+        after self.max_distance steps, points further away all count as max_distance + 1. Afterwards the escape
+        direction (the neighbour that is furthest away from danger) of every point is stored, so that fleeing
+        marines only have to look up their own point. The grid uses game coordinates: [y][x].
+        :param danger_positions: list of sc2 Point2
+        :return: void
+        """
+        distance_field = np.full(self.passable.shape, self.max_distance + 1, dtype="int32")
+        distance_field[~self.passable] = -1
+
+        frontier = np.zeros(self.passable.shape, dtype=bool)
+        for position in danger_positions:
+            col, row = int(position[0]), int(position[1])
+            if 0 <= row < self.map_y_size and 0 <= col < self.map_x_size:
+                frontier[row, col] = True
+        distance_field[frontier] = 0
+
+        unvisited = self.passable & ~frontier
+        for distance in range(1, self.max_distance + 1):
+            rows, cols = np.nonzero(frontier)
+            if len(rows) == 0:
+                break
+
+            # Only grow the search inside the bounding box of the current frontier
+            row_start, row_end = max(rows.min() - 1, 0), min(rows.max() + 2, self.map_y_size)
+            col_start, col_end = max(cols.min() - 1, 0), min(cols.max() + 2, self.map_x_size)
+            box = (slice(row_start, row_end), slice(col_start, col_end))
+            grown = self.dilate(frontier[box]) & unvisited[box]
+
+            frontier = np.zeros(self.passable.shape, dtype=bool)
+            frontier[box] = grown
+            unvisited[box] &= ~grown
+            distance_field[box][grown] = distance
+
+        self.distance_field = distance_field
+        self.escape_direction = self.steepest_ascent(distance_field)
+
+    def dilate(self, array):
+        """
+        Grows a boolean array by one point in all 8 directions.
+        :param array: numpy array (booleans)
+        :return: numpy array (booleans)
+        """
+        padded = np.pad(array, 1)
+        grown = array.copy()
+        for row, col in self.directions:
+            grown |= padded[1 + row:1 + row + array.shape[0], 1 + col:1 + col + array.shape[1]]
+
+        return grown
+
+    def steepest_ascent(self, distance_field):
+        """
+        Returns for every point the index (in self.directions) of the passable neighbour with the largest
+        distance to danger, or -1 when no neighbour is further away than the point itself.
+        :param distance_field: numpy array (ints)
+        :return: numpy array (int8)
+        """
+        padded = np.pad(distance_field, 1, constant_values=-1)
+        neighbours = np.stack([padded[1 + row:1 + row + self.map_y_size, 1 + col:1 + col + self.map_x_size]
+                               for row, col in self.directions])
+        best = np.argmax(neighbours, axis=0)
+        best_distance = np.take_along_axis(neighbours, best[np.newaxis], axis=0)[0]
+        return np.where((best_distance > distance_field) & self.passable, best, -1).astype("int8")
+
+    def escape_point(self, position, steps=4):
+        """
+        Follows the escape directions from a position for a fixed number of steps and returns the point
+        where it ends, so the cost per marine does not depend on the size of the map.
+        :param position: sc2 Point2
+        :param steps: int
+        :return: sc2 Point2
+        """
+        col = min(max(int(position[0]), 0), self.map_x_size - 1)
+        row = min(max(int(position[1]), 0), self.map_y_size - 1)
+        for _ in range(steps):
+            direction = self.escape_direction[row, col]
+            if direction < 0:
+                break
+            row, col = row + self.directions[direction][0], col + self.directions[direction][1]
+
+        return Point2((col + 0.5, row + 0.5))
@@ -1,21 +1,56 @@
 import numpy as np
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 from random import choice
 import sc2
 from sc2.constants import BANELING, MARINE
 from sc2.position import Point2
 from src.MarineAgent import MarineAgent
+from src.ActionMatrixStore import ActionMatrixStore
+from src.DiscMask import DiscMaskCache
+from src.FlowField import FlowField
+from src.SpatialIndex import SpatialIndex
+from src.StepProfiler import StepProfiler
 
 
 class GameBot(sc2.BotAI):
-    def __init__(self, action_matrix):
+    def __init__(self, action_matrix, batched=False, offload=False, use_flow_field=False, incremental=False,
+                 debug_incremental=False, persist=True, store=None, telemetry=None, profiler=None, map_cache=None):
         self.square_info_dictionaries = []
         self.agent_dict: dict["str", MarineAgent] = {}
         self.pathing_map = np.array([])
+        self.disc_masks = None
+        self.danger_field = np.array([])
+        self.danger_masks = []
         self.map_y_size = 0.
         self.map_x_size = 0.
         self.action_matrix = action_matrix
+        self.batched = batched
+        self.persist = persist
+        self.store = store
+        self.telemetry = telemetry
+        self.profiler = profiler if profiler is not None else StepProfiler(enabled=False)
+        self.map_cache = map_cache
+        self.offload = offload
+        self.use_flow_field = use_flow_field
+        self.incremental = incremental
+        # Compares every incremental perception with a full recount, only meant for testing
+        self.debug_incremental = debug_incremental
+        self.flow_field = None
+        self.bane_index = SpatialIndex([])
+        self.unit_positions = {}
+        self.alive_tags = np.array([], dtype="uint64")
+        self.agent_list: list[MarineAgent] = []
+        self.agent_scores = np.array([])
+        self.square_slots = np.zeros(shape=(0, 2), dtype="int64")
+        self.square_tags = np.zeros(shape=(0, 3), dtype="uint64")
+        self.square_attacks = np.zeros(shape=(0, 2), dtype=bool)
+        self.executor = None
+        self.pending_actions = None
+        self.pending_profiler = None
+        self.offloaded_steps = 0
+        self.stale_steps = 0
         self.marine_type_combinations = [["runner", "altruistic"], ["altruistic", "runner"], ["attacker", "altruistic"],
                                          ["altruistic", "attacker"], ["altruistic", "rational"], ["rational", "altruistic"],
                                          ["altruistic", "altruistic"], ["runner", "rational"], ["rational", "runner"],
@@ -27,14 +62,28 @@ class GameBot(sc2.BotAI):
         Defines variables and attributes when the environment is initialized.
         :return: void
         """
-        self.pathing_map = self.game_info.pathing_grid.data_numpy.astype("float64")
+        if self.map_cache is not None:
+            # Reuse the pathing map and disc stencils of earlier games on the same map
+            map_data = self.map_cache.load(self.game_info.map_name, self.game_info.pathing_grid.data_numpy)
+            self.pathing_map = map_data.pathing_map
+            self.disc_masks = map_data.disc_masks
+        else:
+            self.pathing_map = self.game_info.pathing_grid.data_numpy.astype("float64")
+            self.disc_masks = DiscMaskCache(len(self.pathing_map), len(self.pathing_map[0]))
         self.map_y_size = len(self.pathing_map)
         self.map_x_size = len(self.pathing_map[0])
+        self.danger_field = np.ones(shape=(self.map_y_size, self.map_x_size))
+        if self.use_flow_field:
+            self.flow_field = FlowField(self.pathing_map)
+        if self.offload:
+            self.executor = ThreadPoolExecutor(max_workers=1)
         type_combinations = self.marine_type_combinations
 
         # Define all agents in the current environment
         for agent in self.units.of_type(MARINE):
-            self.agent_dict[str(agent.tag)] = MarineAgent(self.pathing_map, self.map_y_size, self.map_x_size, agent.tag)
+            self.agent_dict[str(agent.tag)] = MarineAgent(self.pathing_map, self.map_y_size, self.map_x_size, agent.tag,
+                                                          incremental=self.incremental,
+                                                          debug_incremental=self.debug_incremental)
 
         # Define the combinations of agent 'personalities' / types and assign them
         self.define_square_trios()
@@ -48,39 +97,43 @@ class GameBot(sc2.BotAI):
         for tag in self.agent_dict:
             self.agent_dict[tag].take_action_from_action_matrix(self.action_matrix)
 
+        self.build_square_slots()
+
         return super().on_start()
 
     def update_action_matrix(self):
         """
-        Update the global action_matrix with all the scores of the marineAgents from this iteration.
+        Update the global action_matrix with all the scores of the marineAgents from this iteration. With a
+        store only the changes are appended to its journal, otherwise the whole matrix is written to file.
         :return: void
         """
-        for agent in self.agent_dict.values():
-
-            m1_score = agent.performance_score
-            m2_score = self.agent_dict[str(agent.partner_agent_tag)].performance_score
+        if self.store is not None:
+            self.store.append(self.collect_action_matrix_deltas())
+        else:
+            ActionMatrixStore.merge_deltas(self.action_matrix, self.collect_action_matrix_deltas())
+            self.save_action_matrix_to_file()
 
+    def collect_action_matrix_deltas(self):
+        """
+        Collects the changes this iteration makes to the action_matrix: for every combination of actions the
+        number of new payoffs ("Counts") and the sum of those payoffs ("Sums"). Deltas of different iterations
+        can be merged in any process with ActionMatrixStore.merge_deltas().
+        :return: nested dict
+        """
+        deltas = {"Counts": {}, "Sums": {}}
+        for agent in self.agent_dict.values():
+            partner = self.agent_dict[str(agent.partner_agent_tag)]
             m1_action = agent.chosen_action
-            m2_action = self.agent_dict[str(agent.partner_agent_tag)].chosen_action
-
-            # Update the action matrix with the new scores
-            old_payoffs = self.action_matrix["Scores"][m1_action][m2_action]
-            n0, n1 = self.action_matrix["Counts"][m1_action][m2_action]
-
-            # Calculate running average
-            if n0 != 0 and n1 != 0:
-                new_payoffs = (
-                    (old_payoffs[0] * n0 + m1_score) / (n0 + 1),
-                    (old_payoffs[1] * n1 + m2_score) / (n1 + 1)
-                )
-            else:
-                new_payoffs = (m1_score, m2_score)
+            m2_action = partner.chosen_action
 
-            # Replace the old values
-            self.action_matrix["Scores"][m1_action][m2_action] = new_payoffs
-            self.action_matrix["Counts"][m1_action][m2_action] = (n0+1, n1+1)
+            counts = deltas["Counts"].setdefault(m1_action, {}).setdefault(m2_action, [0, 0])
+            sums = deltas["Sums"].setdefault(m1_action, {}).setdefault(m2_action, [0.0, 0.0])
+            counts[0] += 1
+            counts[1] += 1
+            sums[0] += agent.performance_score
+            sums[1] += partner.performance_score
 
-        self.save_action_matrix_to_file()
+        return deltas
 
     def save_action_matrix_to_file(self, file="action_matrix.json"):
         """
@@ -88,14 +141,30 @@ class GameBot(sc2.BotAI):
         :param file: string
         :return: void
         """
-        with open(file, "w") as f:
-            json.dump(self.action_matrix, f)
+        ActionMatrixStore.write_atomic(file, json.dumps(self.action_matrix))
 
     def save_agent_data(self):
-        epoch = self.action_matrix["Epoch"]
+        """
+        Saves the data of every agent in this iteration. With telemetry the records are buffered in its
+        columnar chunks, otherwise they are appended to agent_data.csv.
+        :return: void
+        """
+        if self.telemetry is not None:
+            self.telemetry.record_agents(self.agent_records())
+            return
+
         with open("agent_data.csv", "a") as data_file:
-            for agent in self.agent_dict.values():
-                data_file.write(f"{agent.tag};{agent.atype};{agent.chosen_action};{agent.performance_score};{epoch}\n")
+            for record in self.agent_records():
+                data_file.write(";".join(str(value) for value in record) + "\n")
+
+    def agent_records(self):
+        """
+        Returns the data of every agent in this iteration as (tag, type, action, score, epoch).
+        :return: list of tuples
+        """
+        epoch = self.action_matrix["Epoch"]
+        return [(agent.tag, agent.atype, agent.chosen_action, agent.performance_score, epoch)
+                for agent in self.agent_dict.values()]
 
     def create_circular_mask(self, center=None, radius=None):
         """
@@ -103,6 +172,7 @@ class GameBot(sc2.BotAI):
         In this case it will be in the StarCraft II map. It then returns this mask as a numpy array
         with boolean values (True = Mask). This is used (for example) to create 'vision masks'
         to determine the vision of a specific sc2 unit using the unit.sight_range attribute.
+        The game loop itself uses self.disc_masks, which returns the same (flipped) circle as a small window.
         :param center: tuple
         :param radius: int/float
         :return: numpy array (booleans)
@@ -122,11 +192,11 @@ class GameBot(sc2.BotAI):
         this in a list of dictionaries to be used in other functions.
         :return: void
         """
+        unit_index = SpatialIndex(self.units)
         for enemy in self.known_enemy_units:
             baneling_tag = enemy.tag
             enemy_position = enemy.position
-            m1_tag = self.units.sorted_by_distance_to(Point2(enemy_position))[0].tag
-            m2_tag = self.units.sorted_by_distance_to(Point2(enemy_position))[1].tag
+            m1_tag, m2_tag = [unit.tag for unit in unit_index.nearest(Point2(enemy_position), 2)]
 
             # Define partner agents so the matrix can be updated correctly
             self.agent_dict[str(m1_tag)].partner_agent_tag = m2_tag
@@ -144,111 +214,300 @@ class GameBot(sc2.BotAI):
         the current vision (known banelings) and stores them in a list which it then returns. This can then
         be used to apply the "Sphere of Fear" (SOF) around the baneling. See apply_baneling_sof() in MarineAgent.py
         :param known_banelings: list of sc2 units
-        :return: list of masks
+        :return: list of DiscMask lists
         """
         mask_list = []
         for bane in known_banelings:
             pos = bane.position.rounded
             b_sight_range = bane.sight_range  # default is 8.0
-            bmask1 = np.flip(self.create_circular_mask(pos, b_sight_range - 6.0), 0)
-            bmask2 = np.flip(self.create_circular_mask(pos, b_sight_range - 2.5), 0)
-            bmask3 = np.flip(self.create_circular_mask(pos, b_sight_range), 0)
+            bmask1 = self.disc_masks.get(pos, b_sight_range - 6.0)
+            bmask2 = self.disc_masks.get(pos, b_sight_range - 2.5)
+            bmask3 = self.disc_masks.get(pos, b_sight_range)
             mask_list.append([bmask1, bmask2, bmask3])
 
         return mask_list
 
+    def update_danger_field(self, known_banelings):
+        """
+        This function combines the "Sphere of Fear" (SOF) of all known banelings into one field of multipliers
+        for the current step. Every marine that sees a baneling applies this shared field to its own vision
+        (see apply_baneling_sof() in MarineAgent.py), so the baneling masks are only built once per step.
+        :param known_banelings: list of sc2 units
+        :return: void
+        """
+        # Reset the areas of the previous step instead of allocating a new field
+        for mask in self.danger_masks:
+            self.danger_field[mask.rows, mask.cols] = 1.0
+
+        self.danger_masks = []
+        for mask_set in self.create_baneling_masks(known_banelings):
+            self.danger_field[mask_set[2].rows, mask_set[2].cols][mask_set[2].mask] *= 0.9    # Bmask 3, sight_range, outer baneling vision
+            self.danger_field[mask_set[1].rows, mask_set[1].cols][mask_set[1].mask] *= 0.5    # Bmask 2, sight_range - 2.5, baneling attack range
+            self.danger_field[mask_set[0].rows, mask_set[0].cols][mask_set[0].mask] *= 0.1    # Bmask 1, sight_range - 6.0, baneling lethal zone
+            self.danger_masks.append(mask_set[2])
+
+    def build_square_slots(self):
+        """
+        This function stores the squares (two marines and a baneling) as arrays, so that the scores of all squares
+        can be handed out at once. The marines are stored by their slot in self.agent_list and the scores are
+        kept in self.agent_scores until the end of the game (see sync_performance_scores()).
+        :return: void
+        """
+        self.agent_list = list(self.agent_dict.values())
+        slots = {str(agent.tag): slot for slot, agent in enumerate(self.agent_list)}
+        squares = self.square_info_dictionaries
+
+        self.square_slots = np.array([[slots[str(d["marine1"])], slots[str(d["marine2"])]] for d in squares],
+                                     dtype="int64").reshape(-1, 2)
+        self.square_tags = np.array([[d["marine1"], d["marine2"], d["baneling_tag"]] for d in squares],
+                                    dtype="uint64").reshape(-1, 3)
+        self.square_attacks = np.array([[self.agent_list[slot].chosen_action == "Attack" for slot in square]
+                                        for square in self.square_slots], dtype=bool).reshape(-1, 2)
+        self.agent_scores = np.array([agent.performance_score for agent in self.agent_list], dtype="float64")
+
+    def update_unit_index(self):
+        """
+        This function indexes the positions of all units that are alive in the current step by their tag.
+        :return: void
+        """
+        self.unit_positions = {unit.tag: unit.position for unit in self.state.units}
+        self.alive_tags = np.fromiter(self.unit_positions, dtype="uint64", count=len(self.unit_positions))
+
     def give_scores(self, last_step = False):
         """
         This function updates the scores of agents based on their performance.
         :param last_step: boolean
         :return: void
         """
-        for square_info in self.square_info_dictionaries:
-            m1_tag = square_info["marine1"]
-            m2_tag = square_info["marine2"]
-            banetag = square_info["baneling_tag"]
-            state = self.check_square_state(m1_tag, m2_tag, banetag)
+        state = np.isin(self.square_tags, self.alive_tags)
 
-            # Give points for being alive
-            if state[0]:
-                self.agent_dict[f"{m1_tag}"].performance_score += 0.5
+        # Give points for being alive
+        scores = 0.5 * state[:, :2]
 
-            if state[1]:
-                self.agent_dict[f"{m2_tag}"].performance_score += 0.5
+        if last_step:
+            # Hand out points for living (+), dying (-) and killing the baneling (++)
+            scores += np.where(state[:, :2], 2, -2)
+            scores += 4 * (~state[:, 2] & self.square_attacks.all(axis=1))[:, np.newaxis]
 
-            if last_step:
-                # Hand out points for living (+), dying (-) and killing the baneling (++)
-                if state[0]:
-                    self.agent_dict[f"{m1_tag}"].performance_score += 2
-                else:
-                    self.agent_dict[f"{m1_tag}"].performance_score -= 2
+        np.add.at(self.agent_scores, self.square_slots, scores)
+        if last_step:
+            self.sync_performance_scores()
 
-                if state[1]:
-                    self.agent_dict[f"{m2_tag}"].performance_score += 2
-                else:
-                    self.agent_dict[f"{m2_tag}"].performance_score -= 2
+    def sync_performance_scores(self):
+        """
+        This function copies the scores from self.agent_scores to the performance_score of the agents.
+        :return: void
+        """
+        for agent, score in zip(self.agent_list, self.agent_scores):
+            agent.performance_score = float(score)
+
+    def update_step_fields(self, baneling_list, profiler=None):
+        """
+        Updates everything that is shared by all agents in the current step: the spatial index of the banelings,
+        the danger field and, when it is used, the escape flow field.
+        :param baneling_list: list of sc2 units
+        :param profiler: StepProfiler (self.profiler if None)
+        :return: void
+        """
+        profiler = profiler if profiler is not None else self.profiler
+        with profiler.phase("step_fields"):
+            self.bane_index = SpatialIndex(baneling_list)
+            self.update_danger_field(baneling_list)
+            if self.flow_field is not None:
+                self.flow_field.update([bane.position for bane in baneling_list])
+
+    def visible_banelings(self, marine, score_mask):
+        """
+        Returns the banelings of the current step that are inside the vision mask of a marine. Only the
+        banelings that the spatial index finds near the marine are checked against the mask.
+        :param marine: sc2 unit
+        :param score_mask: DiscMask
+        :return: list of sc2 units
+        """
+        # The mask is checked at the rounded (floored) and flipped position, which can be up to 3 points away
+        nearby_banes = self.bane_index.within_radius(marine.position, marine.sight_range + 3)
+        return [b for b in nearby_banes if \
+                score_mask.contains(-b.position.rounded[1] + self.map_y_size, b.position.rounded[0])]
+
+    async def step_agents(self, baneling_list):
+        """
+        This function executes the perception and actions of the agents one marine at a time.
+        :param baneling_list: list of sc2 units
+        :return: void
+        """
+        self.update_step_fields(baneling_list)
+        profiler = self.profiler
+        for agent in self.units.of_type(MARINE):
+            # ========== Update agent variables ========== #
+            tag = str(agent.tag)
+            self.agent_dict[tag].position = agent.position
+
+            # ========== Start behaviour process ========== #
+            with profiler.agent(tag):
+                with profiler.phase("masks"):
+                    score_mask = self.disc_masks.get(agent.position, agent.sight_range)
+                with profiler.phase("percept"):
+                    self.agent_dict[tag].percept_environment(score_mask)
+                with profiler.phase("visible_banes"):
+                    visible_banes = self.visible_banelings(agent, score_mask)
+
+            time.sleep(0.01)  # Delay to save performance
+            if len(visible_banes) > 0:
+                # ========== Execute actions ========== #
+                # Added to the time measured above, so the agent still gets one latency sample in this step
+                with profiler.agent(tag):
+                    with profiler.phase("sof"):
+                        self.agent_dict[tag].apply_baneling_sof(self.danger_field, score_mask)
+                    if self.agent_dict[tag].chosen_action == "Attack":
+                        action = agent.attack(visible_banes[0])
+                    elif self.flow_field is not None:
+                        with profiler.phase("best_point"):
+                            action = agent.move(self.flow_field.escape_point(agent.position))
+                    else:
+                        with profiler.phase("best_point"):
+                            action = agent.move(self.agent_dict[tag].get_best_point(score_mask, visible_banes))
+                with profiler.phase("do"):
+                    await self.do(action)
+                profiler.count("actions")
 
-                if not state[2] and self.agent_dict[f"{m1_tag}"].chosen_action == "Attack" \
-                        and self.agent_dict[f"{m2_tag}"].chosen_action == "Attack":
-                    self.agent_dict[f"{m1_tag}"].performance_score += 4
-                    self.agent_dict[f"{m2_tag}"].performance_score += 4
+    def decide_actions_batched(self, marines, baneling_list, profiler=None):
+        """
+        Batched version of the agent loop in step_agents(). The perception and the target selection of all
+        marines are computed together on stacked arrays and the commands are returned instead of being sent,
+        so this can also run outside of the game loop (see step_agents_offloaded()).
+        :param marines: sc2 Units
+        :param baneling_list: list of sc2 units
+        :param profiler: StepProfiler, a forked one when this runs in the worker thread (self.profiler if None)
+        :return: list of sc2 unit commands
+        """
+        profiler = profiler if profiler is not None else self.profiler
+        self.update_step_fields(baneling_list, profiler)
+        agents = [self.agent_dict[str(marine.tag)] for marine in marines]
+        tags = [marine.tag for marine in marines]
+        # The time of the shared batch phases is split over the agents of the batch
+        with profiler.agents(tags):
+            with profiler.phase("masks"):
+                score_masks = [self.disc_masks.get(marine.position, marine.sight_range) for marine in marines]
+        for agent, marine in zip(agents, marines):
+            agent.position = marine.position
+
+        with profiler.agents(tags):
+            with profiler.phase("percept"):
+                MarineAgent.percept_environment_batch(agents, score_masks)
+
+        actions = []
+        fleeing = []
+        for marine, agent, score_mask in zip(marines, agents, score_masks):
+            with profiler.agent(marine.tag):
+                with profiler.phase("visible_banes"):
+                    visible_banes = self.visible_banelings(marine, score_mask)
+                if len(visible_banes) > 0:
+                    with profiler.phase("sof"):
+                        agent.apply_baneling_sof(self.danger_field, score_mask)
+                    if agent.chosen_action == "Attack":
+                        actions.append(marine.attack(visible_banes[0]))
+                    else:
+                        fleeing.append((marine, agent, score_mask))
 
+        with profiler.agents([marine.tag for marine, _, _ in fleeing]):
+            with profiler.phase("best_point"):
+                if self.flow_field is not None:
+                    best_points = [self.flow_field.escape_point(marine.position) for marine, _, _ in fleeing]
+                else:
+                    best_points = MarineAgent.get_best_point_batch([f[1] for f in fleeing],
+                                                                   [f[2] for f in fleeing])
+        actions += [marine.move(point) for (marine, _, _), point in zip(fleeing, best_points)]
+        profiler.count("actions", len(actions))
+        return actions
 
-    def check_square_state(self, m1_tag, m2_tag, b_tag):
+    async def step_agents_batched(self, baneling_list):
         """
-        This function returns a list with ones and zero (like [1,0,1]) a one represents alive and a zero represents
-        the unit being dead. So in the example of the list [1,1,1] both marines and the baneling of a sqaure are alive.
-        In the list [1,0,0] only marine 1 is alive and both marine 2 and the baneling are dead.
-        :param m1_tag: int
-        :param m2_tag: int
-        :param b_tag: int
-        :return: list
+        This function executes the perception and actions of all agents at once, there is no delay between
+        the marines and all commands of this step are sent to the game in one call. The time per step still
+        grows linearly with the number of marines, since every agent perceives its own region of its own score
+        memory; batching only lowers the cost per marine.
+        :param baneling_list: list of sc2 units
+        :return: void
         """
-        return [self.unit_is_alive(m1_tag), self.unit_is_alive(m2_tag), self.unit_is_alive(b_tag)]
+        actions = self.decide_actions_batched(self.units.of_type(MARINE), baneling_list)
+        with self.profiler.phase("do"):
+            await self.do_actions(actions, prevent_double=False)
 
-    def unit_is_alive(self, unit_tag):
+    async def step_agents_offloaded(self, baneling_list):
         """
-        This function checks if a given unit is alive. And returns 0 if the unit is dead and 1 if the unit is alive.
-        :param unit_tag: int
-        :return: int
+        This function runs decide_actions_batched() in a worker thread so the game loop never waits for the
+        perception. Results are double buffered: while one computation runs, the commands of the last finished
+        one are sent and a new computation is only started once the previous one is done. Steps in which the
+        computation was still running are counted as stale.
+        :param baneling_list: list of sc2 units
+        :return: void
         """
-        if self.state.units.find_by_tag(unit_tag) is None:
-            return 0
-        else:
-            return 1
+        self.offloaded_steps += 1
+        if self.pending_actions is not None:
+            if not self.pending_actions.done():
+                self.stale_steps += 1
+                self.profiler.count("stale_steps")
+                return
+
+            actions = self.pending_actions.result()
+            self.pending_actions = None
+            self.profiler.merge(self.pending_profiler)
+            with self.profiler.phase("do"):
+                await self.do_actions(actions, prevent_double=False)
+
+        # The worker measures into its own profiler, which is merged when its result is used
+        self.pending_profiler = self.profiler.fork()
+        self.pending_actions = self.executor.submit(self.decide_actions_batched, self.units.of_type(MARINE),
+                                                    baneling_list, self.pending_profiler)
+
+    def stop_offloading(self):
+        """
+        Waits for the running computation (if any), shuts down the worker thread and reports how often the
+        game loop had to continue with stale results.
+        :return: void
+        """
+        if self.executor is None:
+            return
+
+        self.executor.shutdown(wait=True)
+        self.executor = None
+        if self.pending_actions is not None:
+            self.profiler.merge(self.pending_profiler)
+        self.pending_actions = None
+        if self.offloaded_steps > 0:
+            print(f"Stale perception results: {self.stale_steps}/{self.offloaded_steps} steps "
+                  f"({self.stale_steps / self.offloaded_steps:.1%})")
 
     async def on_step(self, iteration):
         """
         This function executes the perception and actions of the agents inside the simulation (every step).
         :param iteration: iteration (sc2)
         """
+        self.profiler.start_step()
+        self.update_unit_index()
+        if self.telemetry is not None:
+            self.telemetry.record_step(self.action_matrix["Epoch"], self.state.game_loop, self.unit_positions)
         if self.time <= 5:
             baneling_list = [unit for unit in self.known_enemy_units if unit.name == "Baneling"]
-            for agent in self.units.of_type(MARINE):
-                # ========== Update agent variables ========== #
-                tag = str(agent.tag)
-                self.agent_dict[tag].position = agent.position
-
-                # ========== Start behaviour process ========== #
-                score_mask = np.flip(self.create_circular_mask(agent.position, agent.sight_range), 0)
-                self.agent_dict[tag].percept_environment(score_mask)
-                visible_banes = [b for b in baneling_list if \
-                                 score_mask[(-b.position.rounded[1] + self.map_y_size)][b.position.rounded[0]]]
-
-                time.sleep(0.01)  # Delay to save performance
-                if len(visible_banes) > 0:
-                    # ========== Execute actions ========== #
-                    self.agent_dict[tag].apply_baneling_sof(self.create_baneling_masks(visible_banes))
-                    if self.agent_dict[tag].chosen_action == "Attack":
-                        await self.do(agent.attack(visible_banes[0]))
-                    else:
-                        await self.do(agent.move(self.agent_dict[tag].get_best_point(score_mask, visible_banes)))
+            if self.executor is not None:
+                await self.step_agents_offloaded(baneling_list)
+            elif self.batched:
+                await self.step_agents_batched(baneling_list)
+            else:
+                await self.step_agents(baneling_list)
 
-            self.give_scores()
+            with self.profiler.phase("give_scores"):
+                self.give_scores()
+            self.profiler.end_step(self.state.game_loop)
         else:
+            self.stop_offloading()
             self.give_scores(True)
-            self.update_action_matrix()
-            self.save_agent_data()
-            self.save_action_matrix_to_file()
+            if self.persist:
+                self.update_action_matrix()
+                self.save_agent_data()
+            self.profiler.export(self.action_matrix["Epoch"])
+            if self.telemetry is not None:
+                # The writer may be dropped after this game, so never leave records in its buffers
+                self.telemetry.flush()
 
             await self._client.leave()
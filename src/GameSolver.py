@@ -0,0 +1,125 @@
+from functools import lru_cache
+import numpy as np
+
+
+class GameSolver:
+    def __init__(self, row_actions, col_actions, payoffs):
+        self.row_actions = list(row_actions)
+        self.col_actions = list(col_actions)
+        self.payoffs = np.asarray(payoffs, dtype="float64").reshape(len(self.row_actions), len(self.col_actions), 2)
+
+        # Solve the whole game once, every agent that shares this solver only reads the results
+        self.row_best_responses = self.best_responses(0)
+        self.col_best_responses = self.best_responses(1)
+        self.nash_equilibria = self.pure_nash_equilibria()
+        self.pareto_set = self.pareto_optimal()
+
+    @staticmethod
+    def from_action_matrix(action_matrix):
+        """
+        Returns the solver for the "Scores" of an action_matrix, seen from the agent that picks the first action
+        (the rows) with its partner picking the second action (the columns). Solvers are cached by the content
+        of the matrix, so all agents of an iteration share one solve until the matrix changes.
+        :param action_matrix: nested dict
+        :return: GameSolver
+        """
+        scores = action_matrix["Scores"]
+        row_actions = tuple(scores)
+        col_actions = tuple(scores[row_actions[0]])
+        payoffs = tuple(float(value) for row in row_actions for col in col_actions for value in scores[row][col])
+        return GameSolver.cached_solver(row_actions, col_actions, payoffs)
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def cached_solver(row_actions, col_actions, payoffs):
+        """
+        Creates a solver once per unique game (see from_action_matrix()).
+        :param row_actions: tuple of strings
+        :param col_actions: tuple of strings
+        :param payoffs: tuple of floats
+        :return: GameSolver
+        """
+        return GameSolver(row_actions, col_actions, payoffs)
+
+    def best_responses(self, player):
+        """
+        Returns for every cell of the game if the action of a player is a best response to the action of the
+        other player (0 = row player, 1 = column player).
+        :param player: int
+        :return: numpy array (booleans)
+        """
+        payoffs = self.payoffs[:, :, player]
+        return payoffs == payoffs.max(axis=player, keepdims=True)
+
+    def pure_nash_equilibria(self):
+        """
+        Returns every cell in which both actions are a best response to each other.
+        :return: list of tuples (row, col)
+        """
+        return [(int(row), int(col)) for row, col in np.argwhere(self.row_best_responses & self.col_best_responses)]
+
+    def pareto_optimal(self):
+        """
+        Returns every cell for which no other cell is at least as good for both players and better for one.
+        :return: list of tuples (row, col)
+        """
+        flat = self.payoffs.reshape(-1, 2)
+        at_least = (flat[:, np.newaxis, :] >= flat[np.newaxis, :, :]).all(axis=2)
+        better = (flat[:, np.newaxis, :] > flat[np.newaxis, :, :]).any(axis=2)
+        dominated = (at_least & better).any(axis=0)
+        return [divmod(int(index), len(self.col_actions)) for index in np.flatnonzero(~dominated)]
+
+    def dominant_strategy(self, player):
+        """
+        Returns the action of a player that is a best response to every action of the other player, or None
+        when there is no such action. When several actions are dominant the last one is returned.
+        :param player: int
+        :return: int / None
+        """
+        best_responses = self.row_best_responses.all(axis=1) if player == 0 else self.col_best_responses.all(axis=0)
+        dominant = np.flatnonzero(best_responses)
+        return int(dominant[-1]) if len(dominant) > 0 else None
+
+    def maximin(self, player):
+        """
+        Returns the action of a player with the highest payoff in the worst case.
+        :param player: int
+        :return: int
+        """
+        worst_case = self.payoffs[:, :, player].min(axis=1 - player)
+        return int(len(worst_case) - 1 - np.argmax(worst_case[::-1]))
+
+    def rational_choice(self):
+        """
+        Returns the action of the row player for a rational agent that assumes its partner is rational too. Of
+        the pure Nash equilibria the one with the highest total payoff is played. Without an equilibrium the
+        agent plays its dominant strategy, otherwise its best response to the dominant strategy of the partner,
+        and otherwise its maximin action. Ties go to the later action, like the strict comparisons of the
+        original 2x2 version.
+        :return: string
+        """
+        if len(self.nash_equilibria) > 0:
+            totals = [self.payoffs[cell].sum() for cell in self.nash_equilibria]
+            best = len(totals) - 1 - int(np.argmax(totals[::-1]))
+            return self.row_actions[self.nash_equilibria[best][0]]
+
+        own_dominant = self.dominant_strategy(0)
+        if own_dominant is not None:
+            return self.row_actions[own_dominant]
+
+        partner_dominant = self.dominant_strategy(1)
+        if partner_dominant is not None:
+            responses = np.flatnonzero(self.row_best_responses[:, partner_dominant])
+            return self.row_actions[int(responses[-1])]
+
+        return self.row_actions[self.maximin(0)]
+
+    def altruistic_choice(self):
+        """
+        Returns the action of the row player in the Pareto optimal cell with the highest payoffs, compared
+        like the score lists of the action_matrix (own payoff first, then the payoff of the partner). Ties go
+        to the first cell, like max() over the matrix.
+        :return: string
+        """
+        best = max(self.pareto_set, key=lambda cell: tuple(self.payoffs[cell]))
+        return self.row_actions[best[0]]
@@ -0,0 +1,333 @@
+import asyncio
+import math
+import numpy as np
+from sc2.constants import BANELING, MARINE
+from sc2.position import Point2
+
+
+class SimCommand:
+    def __init__(self, unit, ability, target):
+        self.unit = unit
+        self.ability = ability
+        self.target = target
+
+
+class SimUnit:
+    def __init__(self, tag, type_id, position, health, sight_range):
+        self.tag = tag
+        self.type_id = type_id
+        self.position = Point2(position)
+        self.health = health
+        self.sight_range = sight_range
+
+    @property
+    def name(self):
+        """
+        Returns the name of the unit type, like sc2 Unit.name ("Marine" or "Baneling").
+        :return: string
+        """
+        return self.type_id.name.capitalize()
+
+    def distance_to(self, p):
+        """
+        Calculates the distance between this unit and a point or another unit.
+        :param p: sc2 Point2 / SimUnit
+        :return: float
+        """
+        return self.position.distance_to_point2(p.position)
+
+    def move(self, position):
+        """
+        Returns a command to move this unit to a position.
+        :param position: sc2 Point2
+        :return: SimCommand
+        """
+        return SimCommand(self, "move", Point2(position))
+
+    def attack(self, target):
+        """
+        Returns a command to attack another unit.
+        :param target: SimUnit
+        :return: SimCommand
+        """
+        return SimCommand(self, "attack", target.tag)
+
+
+class SimUnits(list):
+    def of_type(self, other):
+        """
+        Returns the units of one or more unit types.
+        :param other: sc2 UnitTypeId / set of UnitTypeIds
+        :return: SimUnits
+        """
+        types = other if isinstance(other, (set, list, tuple)) else {other}
+        return SimUnits(unit for unit in self if unit.type_id in types)
+
+    def find_by_tag(self, tag):
+        """
+        Returns the unit with the given tag or None when it does not exist (anymore).
+        :param tag: int
+        :return: SimUnit
+        """
+        return next((unit for unit in self if unit.tag == tag), None)
+
+    def sorted_by_distance_to(self, position, reverse=False):
+        """
+        Returns the units sorted by their distance to a position.
+        :param position: sc2 Point2 / SimUnit
+        :param reverse: boolean
+        :return: SimUnits
+        """
+        return SimUnits(sorted(self, key=lambda unit: unit.position._distance_squared(position.position),
+                               reverse=reverse))
+
+
+class SimPixelMap:
+    def __init__(self, data_numpy):
+        self.data_numpy = data_numpy
+
+
+class SimGameInfo:
+    def __init__(self, pathing_grid, map_name):
+        self.pathing_grid = SimPixelMap(pathing_grid)
+        self.map_name = map_name
+
+
+class SimState:
+    def __init__(self, units, enemy_units, game_loop):
+        self.units = SimUnits(units + enemy_units)
+        self.enemy_units = SimUnits(enemy_units)
+        self.game_loop = game_loop
+
+
+class SimClient:
+    def __init__(self):
+        self.left = False
+
+    async def leave(self):
+        self.left = True
+
+
+class HeadlessBot:
+    """
+    Mixin that replaces the parts of sc2.BotAI which talk to the game client. Use HeadlessGame.create_bot()
+    to combine it with a bot class like GameBot.
+    """
+    async def do(self, action):
+        self._simulation.queue_commands([action])
+
+    async def do_actions(self, actions, prevent_double=True):
+        self._simulation.queue_commands(actions)
+
+
+class HeadlessGame:
+    def __init__(self, pathing_grid, marine_positions, baneling_positions, map_name="headless", game_step=8,
+                 max_steps=10000):
+        self.pathing_grid = np.asarray(pathing_grid, dtype="uint8")
+        self.map_name = map_name
+        self.game_step = game_step
+        self.max_steps = max_steps
+        self.game_loop = 0
+
+        # Unit stats on 'faster' game speed: [health, sight range, speed per second]
+        self.marine_stats = [45.0, 9.0, 3.15]
+        self.baneling_stats = [30.0, 8.0, 3.5]
+        self.marine_damage = 6.0
+        self.marine_range = 5.0
+        self.marine_cooldown = 0.61
+        # Banelings on the bundled maps kill a marine in one explosion
+        self.baneling_damage = 50.0
+        self.baneling_splash_radius = 2.2
+        self.baneling_explode_range = 1.0
+
+        self.units = {}
+        tag = 4294967297
+        for position in marine_positions:
+            self.units[tag] = self.new_unit(tag, MARINE, position, self.marine_stats)
+            tag += 1
+        for position in baneling_positions:
+            self.units[tag] = self.new_unit(tag, BANELING, position, self.baneling_stats)
+            tag += 1
+
+    def new_unit(self, tag, type_id, position, stats):
+        """
+        Creates the internal state of a unit.
+        :param tag: int
+        :param type_id: sc2 UnitTypeId
+        :param position: tuple
+        :param stats: list
+        :return: dict
+        """
+        return {"tag": tag, "type_id": type_id, "position": np.array(position, dtype="float64"),
+                "health": stats[0], "sight_range": stats[1], "speed": stats[2], "order": None, "cooldown": 0.0}
+
+    @staticmethod
+    def square_layout(squares=12, square_size=16, squares_per_row=4):
+        """
+        Creates a map with a number of walled squares, like 12SquareMarinevsBaneling. Every square holds two
+        marines next to each other with a baneling in sight range on the other side of the square.
+        :param squares: int
+        :param square_size: int
+        :param squares_per_row: int
+        :return: tuple (pathing grid, marine positions, baneling positions)
+        """
+        rows = math.ceil(squares / squares_per_row)
+        pathing_grid = np.zeros((rows * square_size, squares_per_row * square_size), dtype="uint8")
+        marine_positions = []
+        baneling_positions = []
+        for square in range(squares):
+            x = (square % squares_per_row) * square_size
+            y = (square // squares_per_row) * square_size
+            pathing_grid[y + 1:y + square_size - 1, x + 1:x + square_size - 1] = 1
+            center = square_size / 2
+            marine_positions += [(x + 3.5, y + center - 1.0), (x + 3.5, y + center + 1.0)]
+            baneling_positions.append((x + 10.5, y + center))
+
+        return pathing_grid, marine_positions, baneling_positions
+
+    @staticmethod
+    def create_bot(bot_class, *args, **kwargs):
+        """
+        Creates a bot of the given class (like GameBot) that sends its commands to the simulation instead of
+        the game client.
+        :param bot_class: class
+        :return: bot object
+        """
+        headless_class = type(f"Headless{bot_class.__name__}", (HeadlessBot, bot_class), {})
+        return headless_class(*args, **kwargs)
+
+    def snapshot(self):
+        """
+        Creates new unit objects for the current step, like the game client does. Bots can keep these
+        objects (for example in a worker thread) without seeing later changes.
+        :return: SimState
+        """
+        marines, banelings = [], []
+        for unit in self.units.values():
+            sim_unit = SimUnit(unit["tag"], unit["type_id"], tuple(unit["position"]), unit["health"],
+                               unit["sight_range"])
+            (marines if unit["type_id"] == MARINE else banelings).append(sim_unit)
+
+        return SimState(marines, banelings, self.game_loop)
+
+    def prepare_step(self, bot):
+        """
+        Sets the attributes of the bot that sc2.BotAI normally sets from the game state.
+        :param bot: bot object
+        :return: void
+        """
+        bot.state = self.snapshot()
+        bot.units = SimUnits(unit for unit in bot.state.units if unit.type_id == MARINE)
+
+    def queue_commands(self, commands):
+        """
+        Stores the commands of the bot as the new orders of its units.
+        :param commands: list of SimCommands
+        :return: void
+        """
+        for command in commands:
+            if command.unit.tag in self.units:
+                self.units[command.unit.tag]["order"] = (command.ability, command.target)
+
+    def is_passable(self, position):
+        """
+        Checks if a position lies on a passable point of the pathing grid (indexed as [y][x]).
+        :param position: numpy array
+        :return: boolean
+        """
+        col, row = int(position[0]), int(position[1])
+        return 0 <= row < self.pathing_grid.shape[0] and 0 <= col < self.pathing_grid.shape[1] \
+            and self.pathing_grid[row, col] != 0
+
+    def move_towards(self, unit, target, seconds):
+        """
+        Moves a unit in a straight line towards a target. Units stop in front of impassable points.
+        :param unit: dict
+        :param target: numpy array
+        :param seconds: float
+        :return: void
+        """
+        offset = target - unit["position"]
+        distance = np.hypot(*offset)
+        if distance == 0:
+            return
+
+        new_position = unit["position"] + offset * min(unit["speed"] * seconds / distance, 1.0)
+        if self.is_passable(new_position):
+            unit["position"] = new_position
+
+    def advance(self):
+        """
+        Simulates one step of self.game_step game loops: marines follow their orders, banelings chase the closest
+        marine in their sight range and explode when they reach it, hurting every marine in the splash radius.
+        :return: void
+        """
+        seconds = self.game_step / 22.4
+        marines = [unit for unit in self.units.values() if unit["type_id"] == MARINE]
+        banelings = [unit for unit in self.units.values() if unit["type_id"] == BANELING]
+
+        for marine in marines:
+            marine["cooldown"] = max(marine["cooldown"] - seconds, 0.0)
+            if marine["order"] is None:
+                continue
+
+            ability, target = marine["order"]
+            if ability == "move":
+                self.move_towards(marine, np.array(target, dtype="float64"), seconds)
+            elif target in self.units:
+                enemy = self.units[target]
+                if np.hypot(*(enemy["position"] - marine["position"])) > self.marine_range:
+                    self.move_towards(marine, enemy["position"], seconds)
+                elif marine["cooldown"] == 0.0:
+                    enemy["health"] -= self.marine_damage
+                    marine["cooldown"] = self.marine_cooldown
+
+        for baneling in banelings:
+            if baneling["health"] <= 0:
+                continue
+
+            distances = [np.hypot(*(marine["position"] - baneling["position"])) for marine in marines]
+            in_sight = [index for index, distance in enumerate(distances) if distance <= baneling["sight_range"]]
+            if len(in_sight) == 0:
+                continue
+
+            closest = min(in_sight, key=lambda index: distances[index])
+            if distances[closest] > self.baneling_explode_range:
+                self.move_towards(baneling, marines[closest]["position"], seconds)
+                continue
+
+            baneling["health"] = 0
+            for marine in marines:
+                if np.hypot(*(marine["position"] - baneling["position"])) <= self.baneling_splash_radius:
+                    marine["health"] -= self.baneling_damage
+
+        self.units = {tag: unit for tag, unit in self.units.items() if unit["health"] > 0}
+        self.game_loop += self.game_step
+
+    async def play(self, bot):
+        """
+        Plays one episode with the bot until it leaves the game or self.max_steps is reached.
+        :param bot: bot object (see create_bot())
+        :return: void
+        """
+        bot._simulation = self
+        bot._client = SimClient()
+        bot._game_info = SimGameInfo(self.pathing_grid, self.map_name)
+
+        self.prepare_step(bot)
+        bot.on_start()
+        for iteration in range(self.max_steps):
+            self.prepare_step(bot)
+            await bot.on_step(iteration)
+            if bot._client.left:
+                break
+            self.advance()
+
+    def run(self, bot):
+        """
+        Runs play() in a new event loop and returns the bot, so its scores can be read afterwards.
+        :param bot: bot object (see create_bot())
+        :return: bot object
+        """
+        asyncio.run(self.play(bot))
+        return bot
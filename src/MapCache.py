@@ -0,0 +1,32 @@
+import numpy as np
+from src.DiscMask import DiscMaskCache
+
+
+class MapData:
+    def __init__(self, pathing_grid, pathing_map, disc_masks):
+        self.pathing_grid = pathing_grid
+        self.pathing_map = pathing_map
+        self.disc_masks = disc_masks
+
+
+class MapCache:
+    def __init__(self):
+        self.loaded = {}
+
+    def load(self, map_name, pathing_grid):
+        """
+        Returns the data of a map that only depends on the pathing grid: the grid as the float array the agents
+        use and the cache of disc stencils. Games in the same process on the same map reuse this data, so the
+        stencils of earlier games are never computed again. A map whose grid changed gets new data.
+        The pathing map is shared between games and must not be changed.
+        :param map_name: string
+        :param pathing_grid: numpy array (indexed as [y][x])
+        :return: MapData
+        """
+        map_data = self.loaded.get(map_name)
+        if map_data is None or not np.array_equal(map_data.pathing_grid, pathing_grid):
+            pathing_map = np.asarray(pathing_grid).astype("float64")
+            map_data = MapData(np.array(pathing_grid), pathing_map, DiscMaskCache(*pathing_map.shape))
+            self.loaded[map_name] = map_data
+
+        return map_data
@@ -1,12 +1,15 @@
 import numpy as np
 from sc2.position import Point2
+from src.ScoreMemory import ScoreMemory
+from src.GameSolver import GameSolver
 
 
 class MarineAgent:
-    def __init__(self, passability_map, map_y_size, map_x_size, tag):
+    def __init__(self, passability_map, map_y_size, map_x_size, tag, vectorized=True, incremental=False,
+                 debug_incremental=False):
         self.position = None
         self.vismap_stored = False
-        self.vismap_scores = np.zeros(shape=(map_y_size, map_x_size)).astype("float64")
+        self.score_memory = ScoreMemory(map_y_size, map_x_size)
         self.valid_point_threshold = 0.8
         self.passability_map = passability_map
         self.map_y_size = map_y_size
@@ -16,6 +19,27 @@ class MarineAgent:
         self.performance_score = 0
         self.partner_agent_tag = 0
         self.chosen_action = ""
+        self.vectorized = vectorized
+        self.area_distance = 2
+        area_size = (2 * self.area_distance + 1) ** 2
+        self.area_score_table = np.array([round(count / area_size, 2) for count in range(area_size + 1)])
+        self.incremental = incremental
+        self.debug_incremental = debug_incremental
+        self.last_perception = None
+
+    @property
+    def vismap_scores(self):
+        """
+        Returns the scores of the whole map as a float array. The scores themselves are stored compactly in
+        self.score_memory, so this creates a new array and is only meant for the loop versions and analysis.
+        :return: numpy array (floats)
+        """
+        return self.score_memory.to_dense()
+
+    @vismap_scores.setter
+    def vismap_scores(self, scores):
+        self.score_memory.from_dense(scores)
+        self.last_perception = None
 
     def pad_with(self, array, pad_width, iaxis, kwargs):
         """
@@ -45,10 +69,25 @@ class MarineAgent:
         This function generates scores in the current vision_mask. These scores are based on how passable the
         points are and what their area contains (if the area contains a lot of passable points). The scores are
         then calculated and stored in the agent's memory (self.vismap_scores).
-        :param vision_mask: numpy array / list
+        :param vision_mask: DiscMask
+        :return: void
+        """
+        if self.vectorized:
+            self.percept_environment_vectorized(vision_mask)
+        else:
+            self.percept_environment_loop(vision_mask)
+
+    def percept_environment_loop(self, vision_mask):
+        """
+        This is the original point by point version of percept_environment(). It walks over every point of the
+        map and scores the 5x5 area around each visible point separately. It is kept so the vectorized
+        version can be compared against it.
+        :param vision_mask: DiscMask
         :return: void
         """
-        new_map = self.vismap_scores.copy()
+        vision_mask = vision_mask.to_full(self.map_y_size, self.map_x_size)
+        vismap_scores = self.vismap_scores
+        new_map = vismap_scores.copy()
         new_map[vision_mask == True] = 2.0
 
         vismap_padded = np.pad(new_map, 2, self.pad_with, padder=0.)
@@ -60,42 +99,234 @@ class MarineAgent:
                         area[area > self.valid_point_threshold] = 1
                         area[area <= self.valid_point_threshold] = 0
                         score = round(sum(area.flatten()) / (len(area) * len(area[0])), 2)
-                        self.vismap_scores[row][col] = score
+                        vismap_scores[row][col] = score
                     else:
                         vismap_padded[row+2][col+2] = 0.0
-                        self.vismap_scores[row][col] = 0.0
+                        vismap_scores[row][col] = 0.0
 
-    def apply_baneling_sof(self, baneling_masks):
+        self.vismap_scores = vismap_scores
+
+    def box_sum(self, array, distance=2):
         """
-        This function applies modifiers on the score map in the masks given by the baneling_masks.
-        These modifiers indicate to the agent how dangerous areas around the baneling are. These can be
-        seen as multiple circular layers and their impact becomes increasingly negative the closer the agent
-        moves towards the baneling. This way the fear of getting close to the baneling is simulated.
-        :param baneling_masks: list of numpy arrays
+        Sums the values in the (2 * distance + 1) square area around every point of the array using a
+        summed-area table. Points outside of the array count as zero, just like the padding in
+        percept_environment_loop(). The sums are taken over the last two axes, so a stack of arrays
+        (one per agent for example) can be handled in one call.
+        :param array: numpy array
+        :param distance: int
+        :return: numpy array (ints)
+        """
+        size = 2 * distance + 1
+        pad = [(0, 0)] * (array.ndim - 2) + [(distance + 1, distance), (distance + 1, distance)]
+        table = np.pad(array.astype("int32"), pad).cumsum(axis=-2).cumsum(axis=-1)
+        return table[..., size:, size:] - table[..., :-size, size:] - table[..., size:, :-size] \
+            + table[..., :-size, :-size]
+
+    def count_scanned_after(self, array, distance=2):
+        """
+        Counts, for every point, the values in its area that come after the point in row by row scan order.
+        percept_environment_loop() zeroes impassable points while it scans, so an impassable point only
+        still counts as passable for the points that were scanned before it. This count adds those back.
+        :param array: numpy array
+        :param distance: int
+        :return: numpy array (ints)
+        """
+        rows, cols = array.shape[-2:]
+        pad = [(0, 0)] * (array.ndim - 2) + [(distance, distance), (distance, distance)]
+        padded = np.pad(array.astype("int32"), pad)
+        counts = np.zeros(array.shape, dtype="int32")
+        for row, col in self.scanned_after_offsets(distance):
+            counts += padded[..., distance + row:distance + row + rows, distance + col:distance + col + cols]
+
+        return counts
+
+    def scanned_after_offsets(self, distance=2):
+        """
+        Returns the offsets inside an area that come after its center point in row by row scan order.
+        :param distance: int
+        :return: list of tuples
+        """
+        offsets = [(0, col) for col in range(1, distance + 1)]
+        offsets += [(row, col) for row in range(1, distance + 1) for col in range(-distance, distance + 1)]
+        return offsets
+
+    def full_area_counts(self, valid, blocked):
+        """
+        Counts the passable points in the area of every point of a region, see percept_environment_loop().
+        :param valid: numpy array (booleans)
+        :param blocked: numpy array (booleans)
+        :return: numpy array (ints)
+        """
+        return self.box_sum(valid, self.area_distance) + self.count_scanned_after(blocked, self.area_distance)
+
+    def dirty_box(self, changed):
+        """
+        Returns the box of points that have a changed point in their area, and the larger box that their areas
+        read from, or (None, None) when nothing changed.
+        :param changed: numpy array (booleans)
+        :return: tuple of slice tuples
+        """
+        changed_rows = np.flatnonzero(changed.any(axis=1))
+        if len(changed_rows) == 0:
+            return None, None
+
+        changed_cols = np.flatnonzero(changed.any(axis=0))
+        distance = self.area_distance
+        height, width = changed.shape
+        dirty = (slice(max(changed_rows[0] - distance, 0), min(changed_rows[-1] + distance + 1, height)),
+                 slice(max(changed_cols[0] - distance, 0), min(changed_cols[-1] + distance + 1, width)))
+        box = (slice(max(dirty[0].start - distance, 0), min(dirty[0].stop + distance, height)),
+               slice(max(dirty[1].start - distance, 0), min(dirty[1].stop + distance, width)))
+        return dirty, box
+
+    def update_area_counts(self, row_start, col_start, visible, valid, blocked):
+        """
+        Incremental version of the area counts in percept_environment_vectorized(). A point only has to be
+        recounted when a point in its area changed since the previous step. When the vision of the marine
+        changed (it walked) the edge of its disc changes on every side, so the whole region is recounted.
+        Otherwise only the bounding box around the points whose thresholded value changed is recounted, and a
+        marine whose surroundings did not change at all skips the counting completely.
+        :param row_start: int
+        :param col_start: int
+        :param visible: numpy array (booleans)
+        :param valid: numpy array (booleans)
+        :param blocked: numpy array (booleans)
+        :return: numpy array (ints)
+        """
+        last_row_start, last_col_start, last_visible, last_valid, last_blocked, last_counts = self.last_perception
+        if (row_start, col_start) != (last_row_start, last_col_start) or not np.array_equal(visible, last_visible):
+            return self.full_area_counts(valid, blocked)
+
+        dirty, box = self.dirty_box((valid != last_valid) | (blocked != last_blocked))
+        if dirty is None:
+            counts = last_counts
+        else:
+            counts = last_counts.copy()
+            box_counts = self.full_area_counts(valid[box], blocked[box])
+            counts[dirty] = box_counts[dirty[0].start - box[0].start:dirty[0].stop - box[0].start,
+                                       dirty[1].start - box[1].start:dirty[1].stop - box[1].start]
+
+        if self.debug_incremental:
+            scored = visible & ~blocked
+            full_counts = self.full_area_counts(valid, blocked)
+            assert np.array_equal(counts[scored], full_counts[scored]), \
+                f"Incremental perception of agent {self.tag} differs from a full recompute"
+
+        return counts
+
+    def percept_environment_vectorized(self, vision_mask):
+        """
+        Whole-array version of percept_environment_loop(). Instead of slicing an area for every point it
+        thresholds the visible region once and counts the passable points of all 5x5 areas with box_sum().
+        Only the window of the vision mask (plus the 2 point border the areas read from) is read from the
+        score memory, and only the visible points are written back. When self.incremental is set only the
+        points whose area changed since the previous step are recounted (see update_area_counts()).
+        :param vision_mask: DiscMask
         :return: void
         """
-        for mask_set in baneling_masks:
-            self.vismap_scores[(mask_set[2] == True)] *= 0.9    # Bmask 3, sight_range, outer baneling vision
-            self.vismap_scores[(mask_set[1] == True)] *= 0.5    # Bmask 2, sight_range - 2.5, baneling attack range
-            self.vismap_scores[(mask_set[0] == True)] *= 0.1    # Bmask 1, sight_range - 6.0, baneling lethal zone
+        region = self.prepare_perception(vision_mask)
+        row_start, col_start, visible, passable, region_scores, valid, blocked = region
+
+        if self.incremental and self.last_perception is not None:
+            counts = self.update_area_counts(row_start, col_start, visible, valid, blocked)
+        else:
+            counts = self.full_area_counts(valid, blocked)
 
-        self.vismap_scores = np.around(self.vismap_scores.copy(), 2)
+        self.store_perception(region, counts)
 
-    def define_matrix_scores(self, adict):
+    def prepare_perception(self, vision_mask):
         """
-        This function seperates the choices and scores from the dictionary into a comprehensible and iterable
-        multidimensional list.
-        :param adict: nested dict
-        :return: multidimensional list
+        Reads the region of the vision mask (plus the 2 point border the areas read from) and thresholds it.
+        Points that are visible count as passable, except for impassable points which are blocked.
+        :param vision_mask: DiscMask
+        :return: tuple (row_start, col_start, visible, passable, region_scores, valid, blocked)
+        """
+        distance = self.area_distance
+        row_start = max(vision_mask.row_start - distance, 0)
+        row_end = min(vision_mask.rows.stop + distance, self.map_y_size)
+        col_start = max(vision_mask.col_start - distance, 0)
+        col_end = min(vision_mask.cols.stop + distance, self.map_x_size)
+
+        visible = np.zeros((row_end - row_start, col_end - col_start), dtype=bool)
+        visible[vision_mask.row_start - row_start:vision_mask.rows.stop - row_start,
+                vision_mask.col_start - col_start:vision_mask.cols.stop - col_start] = vision_mask.mask
+        passable = self.passability_map[row_start:row_end, col_start:col_end] != 0.0
+        region_scores = self.score_memory.read(slice(row_start, row_end), slice(col_start, col_end))
+
+        blocked = visible & ~passable
+        valid = np.where(visible, 2.0, region_scores) > self.valid_point_threshold
+        valid[blocked] = False
+        return row_start, col_start, visible, passable, region_scores, valid, blocked
+
+    def store_perception(self, region, counts):
+        """
+        Turns the area counts of a region from prepare_perception() into scores and writes the visible points
+        to the score memory.
+        :param region: tuple
+        :param counts: numpy array (ints)
+        :return: void
+        """
+        row_start, col_start, visible, passable, region_scores, valid, blocked = region
+        if self.incremental:
+            self.last_perception = (row_start, col_start, visible, valid, blocked, counts)
+
+        scored = visible & passable
+        region_scores[scored] = self.area_score_table[counts[scored]]
+        region_scores[blocked] = 0.0
+        self.score_memory.write(slice(row_start, row_start + visible.shape[0]),
+                                slice(col_start, col_start + visible.shape[1]), region_scores, visible)
+
+    @staticmethod
+    def percept_environment_batch(agents, vision_masks):
+        """
+        Runs the perception of several agents at once. The regions of all agents are stacked (padded with zeros
+        up to the largest region) so the area counts of every agent are computed with one box_sum() call.
+        This saves the fixed cost of the numpy calls per agent, but the amount of work stays linear in the
+        number of agents: the counts depend on the score memory and the vision of each agent, so there is
+        nothing to share between them. Agents that are in loop or incremental mode still perceive on their own.
+        :param agents: list of MarineAgents
+        :param vision_masks: list of DiscMasks
+        :return: void
         """
-        choices = []
-        scores = []
-        for cat in adict["Scores"]:
-            for subcat in adict["Scores"][cat]:
-                choices.append([f"{cat}", f"{subcat}"])
-                scores.append(adict["Scores"][cat][subcat])
+        batch = []
+        for agent, vision_mask in zip(agents, vision_masks):
+            if agent.vectorized and not agent.incremental:
+                batch.append((agent, agent.prepare_perception(vision_mask)))
+            else:
+                agent.percept_environment(vision_mask)
+
+        if len(batch) == 0:
+            return
 
-        return [choices, scores]
+        height = max(region[2].shape[0] for _, region in batch)
+        width = max(region[2].shape[1] for _, region in batch)
+        valid = np.zeros((len(batch), height, width), dtype=bool)
+        blocked = np.zeros((len(batch), height, width), dtype=bool)
+        for index, (_, region) in enumerate(batch):
+            valid[index, :region[5].shape[0], :region[5].shape[1]] = region[5]
+            blocked[index, :region[6].shape[0], :region[6].shape[1]] = region[6]
+
+        agent = batch[0][0]
+        counts = agent.box_sum(valid, agent.area_distance) + agent.count_scanned_after(blocked, agent.area_distance)
+        for index, (agent, region) in enumerate(batch):
+            agent.store_perception(region, counts[index, :region[2].shape[0], :region[2].shape[1]])
+
+    def apply_baneling_sof(self, danger_field, vision_mask):
+        """
+        This function applies modifiers on the score map in the masks given by the baneling_masks.
+        These modifiers indicate to the agent how dangerous areas around the baneling are. These can be
+        seen as multiple circular layers and their impact becomes increasingly negative the closer the agent
+        moves towards the baneling. This way the fear of getting close to the baneling is simulated.
+        The layers of all banelings are combined once per step in GameBot.update_danger_field(), the agent
+        only multiplies that field into the scores of its own vision.
+        :param danger_field: numpy array
+        :param vision_mask: DiscMask
+        :return: void
+        """
+        scores = self.score_memory.read(vision_mask.rows, vision_mask.cols)
+        modifiers = danger_field[vision_mask.rows, vision_mask.cols]
+        scores[vision_mask.mask] = np.around(scores[vision_mask.mask] * modifiers[vision_mask.mask], 2)
+        self.score_memory.write(vision_mask.rows, vision_mask.cols, scores, vision_mask.mask)
 
     def find_altruistic_best_choice(self, adict):
         """
@@ -104,62 +335,18 @@ class MarineAgent:
         :param adict: nested dict
         :return: string
         """
-        #! Finding a pareto optimallity
-        pairs = self.define_matrix_scores(adict)
-        highest_score = max(pairs[1])  # Get largest scoring pair
-        best_combo = pairs[0][pairs[1].index(highest_score)]  # See what combination results those scores
-        return best_combo[0]  # Return own choice for that combination of choices
+        return GameSolver.from_action_matrix(adict).altruistic_choice()
 
     def find_rational_choice(self, adict):
         """
-        TODO rewrite this docstring for a rational agent.
-        This function is used for the rational agent type, and looks for a nash equilibrium in the state of social dillema.
-        If it can find multiple it will pick the most profitable option for both parties.
-        Else it will settle for a more sub optimal solution.
+        This function is used for the rational agent type, and looks for a nash equilibrium in the state of social
+        dilemma, assuming that the partner agent is also a rational agent. If it can find multiple it will pick the
+        most profitable option for both parties. Else it will settle for its dominant strategy, the best response
+        to the dominant strategy of its partner or the action with the best worst case (see GameSolver).
         :param adict: nested dict
-        :return: string
+        :return: void
         """
-
-        # # * The rational agent always assumes that his partner agent is also a rational agent.
-
-        scores = adict["Scores"]
-        
-        # Looking from the perspective of m1
-        m1_best_combo_m2a = ["Attack", "Attack"] if scores["Attack"]["Attack"][0] > scores["Flee"]["Attack"][0] else ["Flee", "Attack"]
-        m1_best_choice_m2a = m1_best_combo_m2a[0]
-
-        m1_best_combo_m2f = ["Attack", "Flee"] if scores["Attack"]["Flee"][0] > scores["Flee"]["Flee"][0] else ["Flee", "Flee"]
-        m1_best_choice_m2f = m1_best_combo_m2f[0]
-
-        # Now Looking from the partners perspective 
-        m2_best_combo_m1a = ["Attack", "Attack"] if scores["Attack"]["Attack"][1] > scores["Attack"]["Flee"][1] else ["Attack", "Flee"]
-        m2_best_choice_m1a = m2_best_combo_m1a[1]
-
-        m2_best_combo_m1f = ["Flee", "Attack"] if scores["Flee"]["Attack"][1] > scores["Flee"]["Flee"][1] else ["Flee", "Flee"]
-        m2_best_choice_m1f = m2_best_combo_m1f[1]
-
-        # Checking for nash equilibrium
-        if m1_best_combo_m2a == m2_best_combo_m1a or m1_best_combo_m2a == m2_best_combo_m1f:
-            if m1_best_combo_m2f == m2_best_combo_m1a or m1_best_combo_m2a == m2_best_combo_m1f:
-                self.chosen_action = m1_best_choice_m2a if scores[m1_best_combo_m2a].sum() > scores[m1_best_combo_m2f].sum() else m1_best_choice_m2f
-            else:
-                self.chosen_action = m1_best_choice_m2a
-        elif m1_best_combo_m2f == m2_best_combo_m1a or m1_best_combo_m2a == m2_best_combo_m1f:
-            self.chosen_action = m1_best_choice_m2f
-
-        # If now nash equilibrium has been found, figure out and take the best suboptimol outcome for both parties
-        # Check voor een dominantie bij de agents in best choices
-        elif m1_best_choice_m2a == m1_best_choice_m2f:
-            if m1_best_choice_m2a == "Attack":
-                self.chosen_action = m1_best_choice_m2a if m2_best_choice_m1a == "Attack" else m1_best_choice_m2f
-            elif m1_best_choice_m2a == "Flee":
-                self.chosen_action = m1_best_choice_m2a if m2_best_choice_m1f == "Attack" else m1_best_choice_m2f
-
-        elif m2_best_choice_m1a == m2_best_choice_m1f:
-            if m2_best_choice_m1a == "Attack":
-                self.chosen_action = m1_best_choice_m2a
-            elif m2_best_choice_m1a == "Flee":
-                self.chosen_action = m1_best_choice_m2f
+        self.chosen_action = GameSolver.from_action_matrix(adict).rational_choice()
 
     def take_action_from_action_matrix(self, action_matrix):
         """
@@ -181,10 +368,25 @@ class MarineAgent:
         highest scoring point that is also the farthest away from the baneling. The choice is based
         on the viability/passability of the point, and it's surrounding area. It then returns the point
         so that in this case the SC2 bot can execute a move order to that point.
-        :param vision_mask: numpy array
+        :param vision_mask: DiscMask
+        :param known_banes: list of sc2 unit objects
+        :return: sc2 Point2
+        """
+        if self.vectorized:
+            return self.get_best_point_vectorized(vision_mask)
+        return self.get_best_point_loop(vision_mask, known_banes)
+
+    def get_best_point_loop(self, vision_mask, known_banes):
+        """
+        This is the original point by point version of get_best_point(). It walks over every point of the
+        map and keeps track of the highest scoring point and its distance to the baneling. It is kept so the
+        vectorized version can be compared against it.
+        :param vision_mask: DiscMask
         :param known_banes: list of sc2 unit objects
         :return: sc2 Point2
         """
+        vision_mask = vision_mask.to_full(self.map_y_size, self.map_x_size)
+        vismap_scores = self.vismap_scores
         highest_point_in_vision = 0.0
         highest_scoring_point = (0.0, 0.0)
         longest_distance_to_bane = 0.0
@@ -193,14 +395,57 @@ class MarineAgent:
             for col in range(self.map_x_size):
                 if vision_mask[row][col]:
                     bane_dist_to_point = round(known_banes[0].distance_to(Point2((col, row))), 0)
-                    if self.vismap_scores[row][col] >= highest_point_in_vision:
+                    if vismap_scores[row][col] >= highest_point_in_vision:
                         if bane_dist_to_point >= longest_distance_to_bane:
-                            highest_point_in_vision = self.vismap_scores[row][col]
+                            highest_point_in_vision = vismap_scores[row][col]
                             highest_scoring_point = (col, row)
                             longest_distance_to_bane = bane_dist_to_point
                         else:
-                            highest_point_in_vision = self.vismap_scores[row][col]
+                            highest_point_in_vision = vismap_scores[row][col]
                             highest_scoring_point = (col, row)
 
         flipped_point = (highest_scoring_point[0], -highest_scoring_point[1] + self.map_y_size)
         return Point2(flipped_point)
+
+    def get_best_point_vectorized(self, vision_mask):
+        """
+        Whole-array version of get_best_point_loop(). In the loop a point with a score at least as high as the
+        best one so far always becomes the new best point, the distance to the baneling only decides whether
+        longest_distance_to_bane is updated as well. The chosen point is therefore the last visible point
+        (in row by row scan order) with the highest score, which is found here with a single argmax over the
+        window of the vision mask.
+        :param vision_mask: DiscMask
+        :return: sc2 Point2
+        """
+        return MarineAgent.get_best_point_batch([self], [vision_mask])[0]
+
+    @staticmethod
+    def get_best_point_batch(agents, vision_masks):
+        """
+        Runs get_best_point_vectorized() for several agents at once. The scores inside the vision windows are
+        stacked (padded with -1 up to the largest window), which keeps the row by row scan order of every
+        window, so one argmax per agent picks the same points.
+        :param agents: list of MarineAgents
+        :param vision_masks: list of DiscMasks
+        :return: list of sc2 Point2
+        """
+        highest_scoring_points = [(0.0, 0.0)] * len(agents)
+        height = max([vision_mask.mask.shape[0] for vision_mask in vision_masks], default=0)
+        width = max([vision_mask.mask.shape[1] for vision_mask in vision_masks], default=0)
+
+        if height > 0 and width > 0:
+            scores = np.full((len(agents), height, width), -1.0)
+            for index, (agent, vision_mask) in enumerate(zip(agents, vision_masks)):
+                window_scores = agent.score_memory.read(vision_mask.rows, vision_mask.cols)
+                scores[index, :vision_mask.mask.shape[0], :vision_mask.mask.shape[1]] = \
+                    np.where(vision_mask.mask, window_scores, -1.0)
+
+            reversed_scores = scores.reshape(len(agents), -1)[:, ::-1]
+            last_best = height * width - 1 - np.argmax(reversed_scores, axis=1)
+            for index, vision_mask in enumerate(vision_masks):
+                if scores.reshape(len(agents), -1)[index, last_best[index]] >= 0.0:
+                    row, col = divmod(int(last_best[index]), width)
+                    highest_scoring_points[index] = (vision_mask.col_start + col, vision_mask.row_start + row)
+
+        return [Point2((point[0], -point[1] + agent.map_y_size))
+                for agent, point in zip(agents, highest_scoring_points)]
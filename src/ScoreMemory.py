@@ -0,0 +1,111 @@
+import numpy as np
+
+
+class ScoreMemory:
+    def __init__(self, map_y_size, map_x_size, tile_size=16):
+        self.map_y_size = map_y_size
+        self.map_x_size = map_x_size
+        self.tile_size = tile_size
+        self.tiles: dict[tuple, np.ndarray] = {}
+
+    def encode(self, scores):
+        """
+        Turns scores (rounded to two decimals, between 0 and 2.55) into the uint8 values that are stored.
+        :param scores: numpy array (floats)
+        :return: numpy array (uint8)
+        """
+        return np.rint(scores * 100).astype("uint8")
+
+    def decode(self, codes):
+        """
+        Turns stored uint8 values back into scores. Because the scores are rounded to two decimals this gives
+        exactly the same floats that were encoded.
+        :param codes: numpy array (uint8)
+        :return: numpy array (floats)
+        """
+        return codes / 100
+
+    def overlapping_tiles(self, rows, cols):
+        """
+        Yields every tile that overlaps the given area, together with the part of the tile and the part of the
+        area that overlap.
+        :param rows: slice
+        :param cols: slice
+        :return: generator of tuples (tile key, tile slices, area slices)
+        """
+        size = self.tile_size
+        for tile_row in range(rows.start // size, (rows.stop - 1) // size + 1):
+            row_start, row_end = max(rows.start, tile_row * size), min(rows.stop, (tile_row + 1) * size)
+            for tile_col in range(cols.start // size, (cols.stop - 1) // size + 1):
+                col_start, col_end = max(cols.start, tile_col * size), min(cols.stop, (tile_col + 1) * size)
+                yield (tile_row, tile_col), \
+                    (slice(row_start - tile_row * size, row_end - tile_row * size),
+                     slice(col_start - tile_col * size, col_end - tile_col * size)), \
+                    (slice(row_start - rows.start, row_end - rows.start),
+                     slice(col_start - cols.start, col_end - cols.start))
+
+    def read(self, rows, cols):
+        """
+        Returns the scores in an area of the map. Points that were never written to have a score of 0.
+        :param rows: slice
+        :param cols: slice
+        :return: numpy array (floats)
+        """
+        codes = np.zeros((rows.stop - rows.start, cols.stop - cols.start), dtype="uint8")
+        if codes.size > 0:
+            for key, tile_area, area in self.overlapping_tiles(rows, cols):
+                if key in self.tiles:
+                    codes[area] = self.tiles[key][tile_area]
+
+        return self.decode(codes)
+
+    def write(self, rows, cols, scores, mask=None):
+        """
+        Stores the scores of an area of the map. When a mask is given only the points inside the mask are
+        stored. Tiles are only allocated once a non-zero score is written to them.
+        :param rows: slice
+        :param cols: slice
+        :param scores: numpy array (floats)
+        :param mask: numpy array (booleans)
+        :return: void
+        """
+        if scores.size == 0:
+            return
+
+        codes = self.encode(scores)
+        for key, tile_area, area in self.overlapping_tiles(rows, cols):
+            area_codes = codes[area]
+            area_mask = None if mask is None else mask[area]
+            if key not in self.tiles:
+                if not (area_codes if area_mask is None else area_codes[area_mask]).any():
+                    continue
+                self.tiles[key] = np.zeros((self.tile_size, self.tile_size), dtype="uint8")
+
+            if area_mask is None:
+                self.tiles[key][tile_area] = area_codes
+            else:
+                self.tiles[key][tile_area][area_mask] = area_codes[area_mask]
+
+    def to_dense(self):
+        """
+        Returns the scores of the whole map as one float array.
+        :return: numpy array (floats)
+        """
+        return self.read(slice(0, self.map_y_size), slice(0, self.map_x_size))
+
+    def from_dense(self, scores):
+        """
+        Replaces the stored scores with the scores of a whole map float array.
+        :param scores: numpy array (floats)
+        :return: void
+        """
+        self.tiles = {}
+        self.write(slice(0, self.map_y_size), slice(0, self.map_x_size), scores)
+
+    @property
+    def nbytes(self):
+        """
+        Returns the amount of bytes used by the allocated tiles.
+        :return: int
+        """
+        return sum(tile.nbytes for tile in self.tiles.values())
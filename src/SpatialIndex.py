@@ -0,0 +1,77 @@
+import math
+
+
+class SpatialIndex:
+    def __init__(self, units, cell_size=8.0):
+        self.units = list(units)
+        self.cell_size = cell_size
+        self.positions = [unit.position for unit in self.units]
+        self.buckets: dict[tuple, list] = {}
+        for index, position in enumerate(self.positions):
+            self.buckets.setdefault(self.cell_of(position), []).append(index)
+
+    def cell_of(self, point):
+        """
+        Returns the grid cell that contains a point.
+        :param point: sc2 Point2 / tuple
+        :return: tuple
+        """
+        return math.floor(point[0] / self.cell_size), math.floor(point[1] / self.cell_size)
+
+    def distance_squared(self, index, point):
+        """
+        Returns the squared distance between an indexed unit and a point.
+        :param index: int
+        :param point: sc2 Point2 / tuple
+        :return: float
+        """
+        position = self.positions[index]
+        return (position[0] - point[0]) ** 2 + (position[1] - point[1]) ** 2
+
+    def within_radius(self, point, radius):
+        """
+        Returns all units within a radius around a point, in the order in which they were indexed.
+        :param point: sc2 Point2 / tuple
+        :param radius: int/float
+        :return: list of sc2 units
+        """
+        col_start, row_start = self.cell_of((point[0] - radius, point[1] - radius))
+        col_end, row_end = self.cell_of((point[0] + radius, point[1] + radius))
+
+        found = []
+        for col in range(col_start, col_end + 1):
+            for row in range(row_start, row_end + 1):
+                for index in self.buckets.get((col, row), []):
+                    if self.distance_squared(index, point) <= radius ** 2:
+                        found.append(index)
+
+        return [self.units[index] for index in sorted(found)]
+
+    def nearest(self, point, k=1):
+        """
+        Returns the k units closest to a point, closest first. Units at the same distance keep the order in
+        which they were indexed, just like sc2 Units.sorted_by_distance_to(). The cells are searched in rings
+        around the cell of the point until no unsearched cell can contain a closer unit.
+        :param point: sc2 Point2 / tuple
+        :param k: int
+        :return: list of sc2 units
+        """
+        k = min(k, len(self.units))
+        if k <= 0:
+            return []
+
+        center_col, center_row = self.cell_of(point)
+        found = []
+        ring = 0
+        while True:
+            for col in range(center_col - ring, center_col + ring + 1):
+                for row in range(center_row - ring, center_row + ring + 1):
+                    if max(abs(col - center_col), abs(row - center_row)) == ring:
+                        found.extend(self.buckets.get((col, row), []))
+
+            # Every unit outside of the searched rings is at least ring * cell_size away from the point
+            if len(found) >= k:
+                found.sort(key=lambda index: (self.distance_squared(index, point), index))
+                if len(found) == len(self.units) or self.distance_squared(found[k - 1], point) <= (ring * self.cell_size) ** 2:
+                    return [self.units[index] for index in found[:k]]
+            ring += 1
@@ -0,0 +1,198 @@
+import json
+import time
+from contextlib import nullcontext
+import numpy as np
+
+
+class PhaseTimer:
+    def __init__(self, totals, name):
+        self.totals = totals
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.totals.append((self.name, time.perf_counter() - self.start))
+        return False
+
+
+class SharedPhaseTimer(PhaseTimer):
+    def __exit__(self, *exc):
+        # Every list gets an equal share of the time, like the agents of a batch that is computed at once
+        share = (time.perf_counter() - self.start) / len(self.totals)
+        for totals in self.totals:
+            totals.append((self.name, share))
+        return False
+
+
+class StepProfiler:
+    # Shared by every phase when profiling is disabled, so a disabled phase only costs a method call
+    NULL_PHASE = nullcontext()
+
+    def __init__(self, enabled=True, step_budget=1 / 22.4, file="step_profile.jsonl"):
+        self.enabled = enabled
+        self.step_budget = step_budget
+        self.file = file
+        # Agent latency histogram bins in seconds (10 µs up to 50 ms, the last bin holds everything slower)
+        self.latency_bins = np.array([1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3, 2e-3, 5e-3, 1e-2, 2e-2, 5e-2])
+        self.reset()
+
+    def reset(self):
+        """
+        Clears all measurements, used at the start of every episode.
+        :return: void
+        """
+        self.phase_times = {}
+        self.counters = {}
+        self.overruns = []
+        self.steps = 0
+        self.step_start = 0.0
+        self.step_phases = []
+        self.agent_phases = {}
+        self.agent_histograms = {}
+
+    def phase(self, name):
+        """
+        Returns a context manager that measures the time spent in a phase of the current step.
+        :param name: string
+        :return: context manager
+        """
+        if not self.enabled:
+            return self.NULL_PHASE
+        return PhaseTimer(self.step_phases, name)
+
+    def agent(self, tag):
+        """
+        Returns a context manager that measures the time spent on one agent, for its latency histogram. All
+        times measured for an agent in one step are added up into a single sample.
+        :param tag: int / string
+        :return: context manager
+        """
+        if not self.enabled:
+            return self.NULL_PHASE
+        return PhaseTimer(self.agent_phases.setdefault(str(tag), []), "agent")
+
+    def agents(self, tags):
+        """
+        Returns a context manager for work that is done for several agents at once (like the batched
+        perception). Each agent gets an equal share of the time, so the latency histograms of the batched and
+        the sequential mode both hold the time per agent per step.
+        :param tags: list of ints / strings
+        :return: context manager
+        """
+        if not self.enabled or len(tags) == 0:
+            return self.NULL_PHASE
+        return SharedPhaseTimer([self.agent_phases.setdefault(str(tag), []) for tag in tags], "agent")
+
+    def count(self, name, amount=1):
+        """
+        Adds an amount to a counter.
+        :param name: string
+        :param amount: int
+        :return: void
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def start_step(self):
+        """
+        Marks the start of a step.
+        :return: void
+        """
+        if self.enabled:
+            self.step_start = time.perf_counter()
+
+    def end_step(self, game_loop):
+        """
+        Adds the phases of the finished step to the totals and stores an overrun event when the step took
+        longer than self.step_budget.
+        :param game_loop: int
+        :return: void
+        """
+        if not self.enabled:
+            return
+
+        duration = time.perf_counter() - self.step_start
+        self.steps += 1
+        step_phases, self.step_phases = self.step_phases, []
+        agent_phases, self.agent_phases = self.agent_phases, {}
+        self.accumulate(step_phases, agent_phases)
+
+        if duration > self.step_budget:
+            phases = {}
+            for name, seconds in step_phases:
+                phases[name] = phases.get(name, 0.0) + seconds
+            self.overruns.append({"game_loop": game_loop, "duration": duration, "phases": phases})
+
+    def accumulate(self, step_phases, agent_phases):
+        """
+        Adds measured phases to the phase totals and agent timings to the latency histograms, where the timings
+        of each agent are added up into one sample.
+        :param step_phases: list of tuples (name, seconds)
+        :param agent_phases: dict (tag: list of tuples)
+        :return: void
+        """
+        for name, seconds in step_phases:
+            total = self.phase_times.setdefault(name, [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += seconds
+            total[2] = max(total[2], seconds)
+
+        for tag, timings in agent_phases.items():
+            histogram = self.agent_histograms.setdefault(tag, np.zeros(len(self.latency_bins) + 1, dtype="int64"))
+            histogram[np.searchsorted(self.latency_bins, sum(seconds for _, seconds in timings))] += 1
+
+    def fork(self):
+        """
+        Returns a profiler with its own buffers for work that runs in another thread, so its phases are never
+        moved into a step by end_step() while they are still being measured. Add it with merge() once the work
+        is done.
+        :return: StepProfiler
+        """
+        return StepProfiler(self.enabled, self.step_budget, self.file)
+
+    def merge(self, worker):
+        """
+        Adds the phases, agent timings and counters of a forked profiler to the totals. They are not part of the
+        current step, since the work ran next to the game loop instead of inside it.
+        :param worker: StepProfiler (see fork())
+        :return: void
+        """
+        if not self.enabled:
+            return
+
+        self.accumulate(worker.step_phases, worker.agent_phases)
+        for name, amount in worker.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self):
+        """
+        Returns all measurements of the episode as a dict that can be written to JSON.
+        :return: dict
+        """
+        return {
+            "steps": self.steps,
+            "step_budget": self.step_budget,
+            "phases": {name: {"count": count, "total": total, "mean": total / count, "max": maximum}
+                       for name, (count, total, maximum) in self.phase_times.items()},
+            "counters": self.counters,
+            "overruns": self.overruns,
+            "latency_bins": self.latency_bins.tolist(),
+            "agent_latency": {tag: histogram.tolist() for tag, histogram in self.agent_histograms.items()}
+        }
+
+    def export(self, epoch=None):
+        """
+        Appends the summary of the episode as one line to self.file and starts a new episode.
+        :param epoch: int
+        :return: void
+        """
+        if not self.enabled or self.steps == 0:
+            return
+
+        with open(self.file, "a") as f:
+            f.write(json.dumps(dict(self.summary(), epoch=epoch)) + "\n")
+        self.reset()
@@ -0,0 +1,167 @@
+import glob
+import os
+import numpy as np
+
+
+class TelemetryWriter:
+    def __init__(self, directory="telemetry", buffer_size=4096, trace_steps=False):
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.trace_steps = trace_steps
+        # String columns ("str") are sized to the longest value of each chunk, so no type or action is cut off
+        self.columns = {
+            "agents": {"tag": "uint64", "type": "str", "action": "str", "score": "float64", "epoch": "int32"},
+            "steps": {"tag": "uint64", "epoch": "int32", "game_loop": "int32", "x": "float32", "y": "float32"}
+        }
+        self.buffers = {kind: [] for kind in self.columns}
+        os.makedirs(directory, exist_ok=True)
+        self.chunk_numbers = {kind: self.next_chunk_number(kind) for kind in self.columns}
+
+    def next_chunk_number(self, kind):
+        """
+        Returns the number after the highest chunk of a kind in the directory, so an existing chunk is never
+        overwritten, even when numbers are missing.
+        :param kind: string ("agents" or "steps")
+        :return: int
+        """
+        numbers = []
+        for file in glob.glob(os.path.join(self.directory, f"{kind}_*.npz")):
+            number = os.path.basename(file)[len(kind) + 1:-len(".npz")]
+            if number.isdigit():
+                numbers.append(int(number))
+        return max(numbers) + 1 if len(numbers) > 0 else 0
+
+    def record_agents(self, records):
+        """
+        Buffers the data of the agents of one iteration, as (tag, type, action, score, epoch) tuples like
+        GameBot.agent_records() returns them.
+        :param records: list of tuples
+        :return: void
+        """
+        self.add("agents", records)
+
+    def record_step(self, epoch, game_loop, unit_positions):
+        """
+        Buffers the positions of the units in one step, when step traces are enabled.
+        :param epoch: int
+        :param game_loop: int
+        :param unit_positions: dict (tag: sc2 Point2)
+        :return: void
+        """
+        if self.trace_steps:
+            self.add("steps", [(tag, epoch, game_loop, position[0], position[1])
+                               for tag, position in unit_positions.items()])
+
+    def add(self, kind, records):
+        """
+        Adds records to the buffer of a kind and writes the buffer as a new chunk once it is full.
+        :param kind: string ("agents" or "steps")
+        :param records: list of tuples
+        :return: void
+        """
+        self.buffers[kind].extend(records)
+        if len(self.buffers[kind]) >= self.buffer_size:
+            self.flush(kind)
+
+    def flush(self, kind=None):
+        """
+        Writes the buffered records as a new chunk file with one typed array per column. Every flush rotates
+        to a new file, so a chunk never holds more than one buffer. Without a kind all buffers are flushed.
+        :param kind: string ("agents" or "steps")
+        :return: void
+        """
+        for flush_kind in ([kind] if kind is not None else list(self.columns)):
+            records = self.buffers[flush_kind]
+            if len(records) == 0:
+                continue
+
+            columns = {name: np.array([record[index] for record in records], dtype=dtype)
+                       for index, (name, dtype) in enumerate(self.columns[flush_kind].items())}
+            file = os.path.join(self.directory, f"{flush_kind}_{self.chunk_numbers[flush_kind]:06d}.npz")
+            temp_file = f"{file}.tmp"
+            with open(temp_file, "wb") as f:
+                np.savez_compressed(f, **columns)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, file)
+
+            self.chunk_numbers[flush_kind] += 1
+            self.buffers[flush_kind] = []
+
+    def close(self):
+        """
+        Writes everything that is still buffered. Also called when the writer is used in a with statement.
+        :return: void
+        """
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def import_csv(self, csv_file="agent_data.csv"):
+        """
+        Imports the agent data of an agent_data.csv file, so older experiments can be read with the
+        TelemetryReader as well.
+        :param csv_file: string
+        :return: void
+        """
+        with open(csv_file, "r") as data_file:
+            next(data_file)
+            for line in data_file:
+                if line.strip() == "":
+                    continue
+                tag, atype, action, score, epoch = line.strip().split(";")
+                self.add("agents", [(int(tag), atype, action, float(score), int(epoch))])
+
+        self.flush("agents")
+
+
+class TelemetryReader:
+    def __init__(self, directory="telemetry"):
+        self.directory = directory
+
+    def chunks(self, kind="agents"):
+        """
+        Yields the chunks of a kind one at a time, in the order in which they were written.
+        :param kind: string ("agents" or "steps")
+        :return: generator of dicts (column name: numpy array)
+        """
+        for file in sorted(glob.glob(os.path.join(self.directory, f"{kind}_*.npz"))):
+            with np.load(file) as chunk:
+                yield {name: chunk[name] for name in chunk.files}
+
+    def aggregate(self, by="type", column="score"):
+        """
+        Computes the count, mean, standard deviation, minimum and maximum of a column per agent type or per
+        action. Only one chunk is in memory at a time.
+        :param by: string ("type", "action" or "epoch")
+        :param column: string
+        :return: dict (group: dict of statistics)
+        """
+        totals = {}
+        for chunk in self.chunks("agents"):
+            groups, inverse = np.unique(chunk[by], return_inverse=True)
+            values = chunk[column].astype("float64")
+            counts = np.bincount(inverse, minlength=len(groups))
+            sums = np.bincount(inverse, weights=values, minlength=len(groups))
+            squares = np.bincount(inverse, weights=values ** 2, minlength=len(groups))
+            for index, group in enumerate(groups.tolist()):
+                group_values = values[inverse == index]
+                total = totals.setdefault(group, [0, 0.0, 0.0, np.inf, -np.inf])
+                total[0] += int(counts[index])
+                total[1] += sums[index]
+                total[2] += squares[index]
+                total[3] = min(total[3], group_values.min())
+                total[4] = max(total[4], group_values.max())
+
+        statistics = {}
+        for group, (count, total, squares, minimum, maximum) in sorted(totals.items()):
+            mean = float(total / count)
+            statistics[group] = {"count": count, "mean": mean, "std": float(max(squares / count - mean ** 2, 0.0) ** 0.5),
+                                 "min": float(minimum), "max": float(maximum)}
+
+        return statistics